@@ -0,0 +1,15 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from argparse import ArgumentParser
+
+from track_database import compile_tracks
+
+if __name__ == "__main__":
+    parser = ArgumentParser("compile_tracks")
+    parser.add_argument(
+        "tracks",
+        nargs="*",
+        help="names of the tracks to compile (by default all the available tracks)",
+    )
+    args = parser.parse_args()
+    for path in compile_tracks(args.tracks or None):
+        print("compiled", path)
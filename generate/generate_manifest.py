@@ -0,0 +1,7 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from track_database.registry import MANIFEST_FILE, build_manifest, write_manifest
+
+if __name__ == "__main__":
+    manifest = build_manifest()
+    write_manifest(manifest)
+    print(f"wrote {len(manifest['tracks'])} tracks to {MANIFEST_FILE}")
@@ -18,7 +18,7 @@ setup(
     version="3.7.1",
     packages=["track_database"],
     package_dir={"track_database": "track_database"},
-    package_data={"track_database": ["data/*.csv"]},
+    package_data={"track_database": ["data/*.json", "data/*/*.csv", "data/*/*.npy"]},
     url="https://github.com/EPFL-RT-Driverless/track_database",
     author="tudoroancea",
     description="A Python package to gather some default Formula Student tracks as well as some utility functions to import/export them in CSV format and to create new custom tracks.",
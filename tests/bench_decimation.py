@@ -0,0 +1,132 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from track_database import *
+from track_database.geometry import decimate_polyline
+
+
+def interval_errors(
+    points: np.ndarray, widths: np.ndarray, start: int, end: int
+) -> np.ndarray:
+    """
+    Errors of the points strictly between start and end with respect to the segment
+    between them (distance, and deviation of the widths interpolated along it).
+    """
+    a, b = points[start], points[end]
+    inner = points[start + 1 : end]
+    direction = b - a
+    squared_length = direction @ direction
+    if squared_length > 0.0:
+        t = np.clip((inner - a) @ direction / squared_length, 0.0, 1.0)[:, None]
+    else:
+        t = np.zeros((inner.shape[0], 1))
+    error = np.hypot(*(inner - a - t * direction).T)
+    deviation = np.abs(
+        widths[start + 1 : end] - widths[start] - t * (widths[end] - widths[start])
+    )
+    return np.maximum(error, deviation.max(axis=1, initial=0.0))
+
+
+def reference_decimate(
+    points: np.ndarray, closed: bool, tolerance: float, widths: np.ndarray
+) -> np.ndarray:
+    """
+    Reference implementation of decimate_polyline(): the recursive Douglas-Peucker
+    algorithm processing one interval at a time, from the same initial points.
+    Returns the indices of the kept points.
+    """
+    n_points = points.shape[0]
+    if closed:
+        points = np.concatenate((points, points[:1]))
+        widths = np.concatenate((widths, widths[:1]))
+        far = int(np.argmax(np.hypot(*(points[:-1] - points[0]).T)))
+        direction = points[far] - points[0]
+        delta = points[:-1] - points[0]
+        third = int(
+            np.argmax(np.abs(direction[0] * delta[:, 1] - direction[1] * delta[:, 0]))
+        )
+        initial = sorted({0, far, third, n_points})
+    else:
+        initial = [0, n_points - 1]
+    kept = set(initial)
+
+    def simplify(start: int, end: int):
+        if end - start < 2:
+            return
+        error = interval_errors(points, widths, start, end)
+        worst = int(np.argmax(error))
+        if error[worst] > tolerance:
+            kept.add(start + 1 + worst)
+            simplify(start, start + 1 + worst)
+            simplify(start + 1 + worst, end)
+
+    for start, end in zip(initial[:-1], initial[1:]):
+        simplify(start, end)
+    return np.array(sorted(i for i in kept if i < n_points))
+
+
+def brute_force_max_error(
+    points: np.ndarray, closed: bool, widths: np.ndarray, indices: np.ndarray
+) -> float:
+    """
+    Recomputes the maximum error of the removed points of a decimation with respect
+    to the segment of the decimated polyline between the kept points around them.
+    """
+    ends = np.append(indices, points.shape[0] if closed else indices[-1])
+    if closed:
+        points = np.concatenate((points, points[:1]))
+        widths = np.concatenate((widths, widths[:1]))
+    max_error = 0.0
+    for start, end in zip(ends[:-1], ends[1:]):
+        if end - start > 1:
+            max_error = max(
+                max_error, interval_errors(points, widths, start, end).max()
+            )
+    return max_error
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_decimation")
+    parser.add_argument(
+        "--tolerances", type=float, nargs="+", default=[0.01, 0.1, 0.5, 1.0, 5.0]
+    )
+    parser.add_argument("--tracks", type=str, nargs="+", default=available_tracks)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for name in args.tracks:
+        track = load_track(name)
+        # densely resampled so that the decimation has work to do
+        dense = track.resample(0.05)
+        points, widths, closed = dense.center_line, dense.track_widths, dense.is_closed
+        for tolerance in args.tolerances:
+            # best time of repeat runs, interleaved so that load variations of the
+            # machine affect both implementations alike
+            reference, current = np.inf, np.inf
+            for _ in range(args.repeat):
+                start = perf_counter()
+                expected = reference_decimate(points, closed, tolerance, widths)
+                reference = min(reference, perf_counter() - start)
+                start = perf_counter()
+                decimation = decimate_polyline(points, closed, tolerance, widths)
+                current = min(current, perf_counter() - start)
+
+            assert np.array_equal(decimation.indices, expected), (name, tolerance)
+            assert np.array_equal(
+                decimation.segment,
+                np.searchsorted(expected, np.arange(points.shape[0]), side="right") - 1,
+            ), (name, tolerance)
+            max_error = brute_force_max_error(points, closed, widths, expected)
+            assert max_error <= tolerance, (name, tolerance)
+            assert np.isclose(decimation.max_error, max_error, rtol=0.0, atol=1e-12), (
+                name,
+                tolerance,
+            )
+            print(
+                f"{name:>24} {tolerance:5.2f} m: {points.shape[0]:>6} -> "
+                f"{decimation.indices.shape[0]:>5} points, max error "
+                f"{max_error:.4f} m, reference {1000 * reference:8.2f} ms, "
+                f"decimate_polyline {1000 * current:6.2f} ms"
+            )
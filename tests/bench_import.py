@@ -0,0 +1,54 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import subprocess
+import sys
+from argparse import ArgumentParser
+
+# packages that must only be imported when the features using them are first used
+HEAVY_MODULES = ("matplotlib", "scipy", "shapely", "pandas", "dict2xml")
+
+CHILD_SCRIPT = f"""
+import sys
+from time import perf_counter
+start = perf_counter()
+import track_database
+print(perf_counter() - start)
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+def cold_import() -> tuple[float, list[str]]:
+    """
+    Imports track_database in a fresh interpreter and returns the import time and the
+    heavy modules that were loaded along with it.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.splitlines()
+    return float(output[0]), [m for m in output[1].split(",") if m]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_import")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--max_ms",
+        type=float,
+        default=None,
+        help="fail if the best cold import time exceeds this value",
+    )
+    args = parser.parse_args()
+
+    times = []
+    for _ in range(args.repeat):
+        duration, heavy_modules = cold_import()
+        if heavy_modules:
+            sys.exit(f"import track_database loaded {', '.join(heavy_modules)}")
+        times.append(duration)
+
+    best = 1000 * min(times)
+    print(f"import track_database: best {best:.1f} ms over {args.repeat} cold imports")
+    if args.max_ms is not None and best > args.max_ms:
+        sys.exit(f"cold import took {best:.1f} ms, more than {args.max_ms} ms")
@@ -0,0 +1,69 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import os
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from track_database.utils import *
+
+
+def genfromtxt_load_cones(filename: str):
+    """Reference implementation of load_cones() based on np.genfromtxt(dtype=str)."""
+    arr = np.genfromtxt(filename, delimiter=",", dtype=str, skip_header=1)
+    return (
+        arr[arr[:, 0] == "blue"][:, 1:3].astype(float),
+        arr[arr[:, 0] == "yellow"][:, 1:3].astype(float),
+        arr[arr[:, 0] == "big_orange"][:, 1:3].astype(float),
+        arr[arr[:, 0] == "small_orange"][:, 1:3].astype(float),
+        arr[arr[:, 7] == "1"][:, 1:3].astype(float),
+        arr[arr[:, 8] == "1"][:, 1:3].astype(float),
+    )
+
+
+def write_random_cones(filename: str, n_cones: int, seed: int = 0):
+    """Writes a SLAM-sized cone map with n_cones random cones of all colors."""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-500.0, 500.0, (n_cones, 2))
+    colors = rng.integers(0, len(CONE_TYPES), n_cones)
+    save_cones(
+        filename,
+        *(xy[colors == code] for code in range(len(CONE_TYPES))),
+    )
+
+
+def timeit(functions, *args, repeat: int = 10) -> list[float]:
+    """
+    Returns the best time of each function over repeat runs, interleaved so that load
+    variations of the machine affect all of them alike.
+    """
+    best = [np.inf] * len(functions)
+    for _ in range(repeat):
+        for i, f in enumerate(functions):
+            start = perf_counter()
+            f(*args)
+            best[i] = min(best[i], perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_load_cones")
+    parser.add_argument("--n_cones", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_cones in args.n_cones:
+            filename = os.path.join(tmp_dir, f"random_{n_cones}_cones.csv")
+            write_random_cones(filename, n_cones)
+            for expected, actual in zip(
+                genfromtxt_load_cones(filename), load_cones(filename)
+            ):
+                assert np.array_equal(expected, actual)
+            reference, current, table = timeit(
+                (genfromtxt_load_cones, load_cones, load_cone_table), filename
+            )
+            print(
+                f"{n_cones:>7} cones: genfromtxt {1000 * reference:8.2f} ms, "
+                f"load_cones {1000 * current:8.2f} ms ({reference / current:5.1f}x), "
+                f"load_cone_table {1000 * table:8.2f} ms ({reference / table:5.1f}x)"
+            )
@@ -0,0 +1,75 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import os
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from track_database import *
+from track_database.registry import DATA_DIR
+from track_database.tracks import _is_compiled_track
+
+
+def copy_tracks(tmp_dir: str, copies: int) -> list[str]:
+    """
+    Copies the directories of the available tracks copies times into tmp_dir (so that
+    compiling them does not touch the package data) and returns their paths.
+    """
+    paths = []
+    for k in range(copies):
+        for name in available_tracks:
+            path = os.path.join(tmp_dir, f"{name}_{k}")
+            shutil.copytree(os.path.join(DATA_DIR, name), path)
+            paths.append(path)
+    return paths
+
+
+def timeit(paths: list[str], workers: int, use_processes, repeat: int) -> float:
+    """Returns the best time of load_tracks() over repeat runs, without the cache."""
+    best = np.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        track_set = load_tracks(paths, workers, use_processes, use_cache=False)
+        best = min(best, perf_counter() - start)
+        assert len(track_set) == len(paths), track_set.failures
+    return best
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_load_tracks")
+    parser.add_argument("--copies", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if args.workers is None:
+        max_workers = os.cpu_count() or 1
+        args.workers = sorted(
+            {1, max_workers} | {2**k for k in range(1, max_workers.bit_length())}
+        )
+    print(f"{os.cpu_count()} CPUs")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = copy_tracks(tmp_dir, args.copies)
+        for compiled in (False, True):
+            if compiled:
+                compile_tracks(paths)
+            assert all(_is_compiled_track(path) for path in paths) == compiled
+            print(
+                f"{len(paths)} tracks loaded from their "
+                f"{'compiled' if compiled else 'CSV'} files:"
+            )
+            serial = timeit(paths, 1, None, args.repeat)
+            for workers in args.workers:
+                times = [
+                    timeit(paths, workers, use_processes, args.repeat)
+                    for use_processes in (False, True, None)
+                ]
+                print(
+                    f"{workers:>4} workers: "
+                    + ", ".join(
+                        f"{label} {1000 * t:8.2f} ms (x{serial / t:5.2f})"
+                        for label, t in zip(("threads", "processes", "default"), times)
+                    )
+                )
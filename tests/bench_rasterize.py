@@ -0,0 +1,160 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from track_database import *
+from track_database.geometry import interpolate_polyline
+from track_database.utils import make_cone_table
+
+
+def project_clearance(track: Track, points: np.ndarray) -> np.ndarray:
+    """
+    Ground truth of the drivable area from the Frenet projection (Track.project()):
+    returns, for each point of an (N, 2) array, how far inside the track width on the
+    side of its projection it is (negative if outside), cut at the ends of open tracks.
+    """
+    projection = track.project(points)
+    widths = interpolate_polyline(
+        track.center_line, track.track_widths, track.is_closed, projection.s
+    )
+    clearance = np.where(projection.d >= 0.0, widths[:, 1], widths[:, 0]) - np.abs(
+        projection.d
+    )
+    if not track.is_closed:
+        clearance = np.minimum(
+            clearance, np.minimum(projection.s, track.length - projection.s)
+        )
+    return clearance
+
+
+def width_tolerance(track: Track) -> float:
+    """
+    Largest distance by which the drivable area of TrackArea can exceed the projected
+    track widths: its boundary points are offset along the normals at the center line
+    points, which make an angle alpha with the normals of the adjacent segments, so
+    where the widths vary with a slope k along a segment, the boundary can be up to
+    k * width * sin(alpha) beyond the width at the arc length it projects on. It is 0
+    for constant widths.
+    """
+    segments = track.segments
+    i = np.arange(segments.length.shape[0])
+    j = (i + 1) % track.center_line.shape[0]
+    widths = track.track_widths
+    slope = np.divide(
+        np.abs(widths[j] - widths[i]),
+        segments.length[:, None],
+        out=np.zeros((i.shape[0], 2)),
+        where=segments.length[:, None] > 0.0,
+    )
+    sin_i = np.abs(np.sin(track.heading[i] - segments.heading))[:, None]
+    sin_j = np.abs(np.sin(track.heading[j] - segments.heading))[:, None]
+    return float(np.max(slope * np.maximum(widths[i] * sin_i, widths[j] * sin_j)))
+
+
+def random_track(rng: np.random.Generator) -> Track:
+    """
+    Generates a densely sampled track with right and left widths varying smoothly and
+    independently along it, where the projection is well-posed: the track widths stay
+    below half the radius of curvature. Open tracks only cover part of a loop, so that
+    the extensions of their ends do not run into the track.
+    """
+    while True:
+        closed = bool(rng.integers(2))
+        n_points = int(rng.integers(100, 400))
+        end = 2.0 * np.pi if closed else rng.uniform(0.5, 1.5) * np.pi
+        theta = np.linspace(0.0, end, n_points, endpoint=not closed)
+        k = np.arange(2, 5)[:, None]
+        amplitude = rng.uniform(0.0, 0.1, (3, 1))
+        phase = rng.uniform(0.0, 2.0 * np.pi, (3, 1))
+        radius = rng.uniform(15.0, 40.0) * (
+            1.0 + np.sum(amplitude * np.cos(k * theta + phase), axis=0)
+        )
+        center_line = radius[:, None] * np.column_stack((np.cos(theta), np.sin(theta)))
+        frequency = rng.integers(1, 6, (1, 2))
+        phase = rng.uniform(0.0, 2.0 * np.pi, (1, 2))
+        track_widths = 0.3 + 1.7 * (1.0 + np.sin(frequency * theta[:, None] + phase))
+        no_cones = np.empty((0, 2))
+        track = Track.from_arrays(
+            "random",
+            make_cone_table(no_cones, no_cones, no_cones, no_cones),
+            center_line,
+            track_widths,
+            closed,
+        )
+        if np.all(2.0 * track_widths.max() * np.abs(track.curvature) < 1.0):
+            return track
+
+
+def check(track: Track, resolution: float, cone_radius: float) -> tuple:
+    """
+    Compares the free cells of the raster of the track to the ground truth at their
+    centers. Returns the numbers of free cells and of cells on the track (and not in a
+    cone) that are occupied, the largest clearance of these and the time taken by the
+    rasterization.
+    """
+    start = perf_counter()
+    raster = track.rasterize(resolution, cone_radius, use_cache=False)
+    elapsed = perf_counter() - start
+    rows, cols = np.indices(raster.shape)
+    centers = raster.origin + (np.stack((cols, rows), axis=-1) + 0.5) * resolution
+    centers = centers.reshape(-1, 2)
+    free = ~raster.occupancy.reshape(-1)
+    clearance = project_clearance(track, centers)
+    # no cell off the track (up to rounding errors and the tolerance on the widths)
+    # may be free
+    assert np.all(clearance[free] > -width_tolerance(track) - 1e-9), track.name
+    # the cells on the track but close to a cone are occupied as expected
+    occupied = np.flatnonzero(~free & (clearance > 0.0))
+    distance = track.query_nearest(centers[occupied]).distances[:, 0]
+    missed = occupied[distance > cone_radius + resolution / np.sqrt(2.0)]
+    return (
+        np.count_nonzero(free),
+        missed.shape[0],
+        clearance[missed].max(initial=0.0),
+        elapsed,
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_rasterize")
+    parser.add_argument("--resolution", type=float, default=0.2)
+    parser.add_argument("--cone_radius", type=float, default=0.15)
+    parser.add_argument("--tracks", type=str, nargs="+", default=available_tracks)
+    parser.add_argument("--n_random", type=int, default=50)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    # the cell beyond an outer corner, on the side of the narrow width, is occupied
+    no_cones = np.empty((0, 2))
+    square = Track.from_arrays(
+        "square",
+        make_cone_table(no_cones, no_cones, no_cones, no_cones),
+        np.array([[0.0, 0.0], [20.0, 0.0], [20.0, 20.0], [0.0, 20.0]]),
+        np.array([[3.3, 3.3], [2.3, 1.5], [0.7, 1.8], [1.9, 0.7]]),
+        closed=True,
+    )
+    raster = square.rasterize(args.resolution, use_cache=False)
+    col, row = np.rint(raster.world_to_grid([21.5, 20.0])).astype(int)
+    assert raster.occupancy[row, col]
+
+    for name in args.tracks:
+        n_free, n_missed, max_missed, elapsed = check(
+            load_track(name), args.resolution, args.cone_radius
+        )
+        print(
+            f"{name:>24}: {n_free:>7} free cells, 0 off the track, {n_missed:>5} on "
+            f"the track occupied (up to {max_missed:.3f} m inside), rasterized in "
+            f"{1000 * elapsed:7.2f} ms"
+        )
+
+    n_missed, max_missed = 0, 0.0
+    for _ in range(args.n_random):
+        result = check(random_track(rng), args.resolution, args.cone_radius)
+        n_missed += result[1]
+        max_missed = max(max_missed, result[2])
+    print(
+        f"{args.n_random} random tracks with asymmetric widths: 0 free cells off the "
+        f"track, {n_missed} on the track occupied (up to {max_missed:.3f} m inside)"
+    )
@@ -0,0 +1,66 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from bench_track_area import edge_distance, reference_contains
+from track_database import *
+from track_database.geometry import sample_polyline
+from track_database.utils import CONE_TYPES
+
+
+def boundary_gap(track: Track, reconed: Track, step: float = 0.05) -> float:
+    """
+    Returns the largest distance from a point of the left or right boundary that is
+    not on the track (tested slightly outwards, as Track.recone() does) to the closest
+    cone of the reconed track.
+    """
+    normal = np.column_stack((-np.sin(track.heading), np.cos(track.heading)))
+    samples = np.concatenate(
+        [
+            sample_polyline(boundary, track.is_closed, step, np.hstack((boundary, n)))
+            for boundary, n in (
+                (track.left_boundary, normal),
+                (track.right_boundary, -normal),
+            )
+        ]
+    )
+    off_track = ~reference_contains(track, samples[:, :2] + 1e-6 * samples[:, 2:])
+    distances = cKDTree(reconed.cones["xy"]).query(samples[off_track, :2])[0]
+    return float(distances.max(initial=0.0))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_recone")
+    parser.add_argument("--spacings", type=float, nargs="+", default=[1.0, 3.0, 5.0])
+    parser.add_argument("--tracks", type=str, nargs="+", default=available_tracks)
+    args = parser.parse_args()
+    for name in args.tracks:
+        for spacing in args.spacings:
+            # a new track each time so that nothing is cached
+            track = load_track(name)
+            start = perf_counter()
+            reconed = track.recone(spacing)
+            elapsed = perf_counter() - start
+
+            placed = reconed.cones["color"] < CONE_TYPES.index("big_orange")
+            xy, orange = reconed.cones["xy"][placed], reconed.cones["xy"][~placed]
+            # no placed cone strictly inside the drivable area (the ones on its
+            # boundary, up to rounding errors, are where they belong)
+            inside = reference_contains(track, xy)
+            inside[inside] = edge_distance(track, xy[inside]) > 1e-9
+            assert not np.any(inside), (name, spacing)
+            # no placed cone within spacing / 2 of an orange cone or of another one
+            if orange.shape[0] > 0:
+                assert np.all(cKDTree(orange).query(xy)[0] > 0.5 * spacing), (
+                    name,
+                    spacing,
+                )
+            assert len(cKDTree(xy).query_pairs(0.5 * spacing)) == 0, (name, spacing)
+            print(
+                f"{name:>24} {spacing:4.1f} m: {xy.shape[0]:>4} cones placed, largest "
+                f"gap along the boundaries {boundary_gap(track, reconed):5.2f} m, "
+                f"recone {1000 * elapsed:6.2f} ms"
+            )
@@ -0,0 +1,79 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+from shapely.geometry.polygon import LineString, Point
+
+from track_database.track_generator import Mode, TrackGenerator, closest_node
+
+
+def reference_select_points(
+    generator: TrackGenerator, input_points: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Reference implementation of TrackGenerator.select_points(), with one closest_node()
+    call per region in EXPAND mode and one shapely distance per point in EXTEND mode.
+    """
+    if generator._mode == Mode.EXPAND:
+        random_index = rng.integers(0, generator._n_points)
+        random_point_indices = [random_index]
+        random_point = input_points[random_index]
+        for i in range(generator._n_regions - 1):
+            random_point_indices.append(
+                closest_node(random_point, input_points, k=i + 1)
+            )
+        return np.array(random_point_indices)
+    elif generator._mode == Mode.EXTEND:
+        random_index = rng.integers(0, generator._n_points)
+        random_heading = rng.uniform(0, np.pi / 2)
+        random_point = input_points[random_index]
+        half_line = (
+            0.5
+            * generator._max_bound
+            * np.array([np.cos(random_heading), np.sin(random_heading)])
+        )
+        line = LineString([random_point - half_line, random_point + half_line])
+        distances = [Point(p).distance(line) for p in input_points]
+        return np.argpartition(distances, generator._n_regions)[: generator._n_regions]
+    else:
+        return rng.integers(0, generator._n_points, generator._n_regions)
+
+
+def timeit(f, *args, repeat: int = 5) -> float:
+    best = np.inf
+    for seed in range(repeat):
+        rng = np.random.default_rng(seed)
+        start = perf_counter()
+        f(*args, rng)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_region_selection")
+    parser.add_argument(
+        "--n_points", type=int, nargs="+", default=[60, 500, 2000, 10000]
+    )
+    parser.add_argument("--n_regions", type=int, default=20)
+    args = parser.parse_args()
+    for mode in Mode:
+        for n_points in args.n_points:
+            generator = TrackGenerator(
+                n_points=n_points, n_regions=args.n_regions, mode=mode
+            )
+            input_points = np.random.default_rng(0).uniform(0.0, 150.0, (n_points, 2))
+            for seed in range(5):
+                expected = reference_select_points(
+                    generator, input_points, np.random.default_rng(seed)
+                )
+                actual = generator.select_points(
+                    input_points, np.random.default_rng(seed)
+                )
+                assert set(expected) == set(actual)
+            reference = timeit(reference_select_points, generator, input_points)
+            current = timeit(generator.select_points, input_points)
+            print(
+                f"{mode.name:>6} {n_points:>6} points: reference {1000 * reference:8.3f} ms, "
+                f"select_points {1000 * current:8.3f} ms, speedup {reference / current:6.1f}x"
+            )
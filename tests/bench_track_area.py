@@ -0,0 +1,166 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from track_database import *
+from track_database.utils import make_cone_table
+
+
+def reference_quadrilaterals(track: Track) -> np.ndarray:
+    """
+    Returns the (2K, 4, 2) array of the quadrilaterals whose union is the drivable
+    area of TrackArea: on each side of each of the K center line segments, the one
+    between the segment and the boundary points at its ends.
+    """
+    n_points = track.center_line.shape[0]
+    i = np.arange(n_points if track.is_closed else n_points - 1)
+    j = (i + 1) % n_points
+    c, left, right = track.center_line, track.left_boundary, track.right_boundary
+    return np.concatenate(
+        (
+            np.stack((c[i], c[j], left[j], left[i]), axis=1),
+            np.stack((c[i], right[i], right[j], c[j]), axis=1),
+        )
+    )
+
+
+def reference_contains(track: Track, points: np.ndarray) -> np.ndarray:
+    """
+    Reference implementation of the membership test of TrackArea without the grid:
+    tests each point of an (N, 2) array against every quadrilateral whose bounding box
+    contains it, with its winding number computed as the sum of the angles under which
+    the point sees the edges.
+    """
+    inside = np.zeros(points.shape[0], dtype=bool)
+    for quad in reference_quadrilaterals(track):
+        idx = np.flatnonzero(
+            np.all((points >= quad.min(axis=0)) & (points <= quad.max(axis=0)), axis=1)
+        )
+        a = quad[:, None, :] - points[idx]
+        b = np.roll(a, -1, axis=0)
+        cross = a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+        winding = np.arctan2(cross, np.sum(a * b, axis=-1)).sum(axis=0) / (2 * np.pi)
+        inside[idx[np.abs(winding) > 0.5]] = True
+    return inside
+
+
+def edge_distance(track: Track, points: np.ndarray) -> np.ndarray:
+    """
+    Returns the distance from each point of an (N, 2) array to the closest edge of
+    the quadrilaterals of the drivable area.
+    """
+    quads = reference_quadrilaterals(track)
+    start = quads.reshape(-1, 2)
+    edge = (np.roll(quads, -1, axis=1) - quads).reshape(-1, 2)
+    delta = points[:, None, :] - start
+    squared_length = np.sum(edge * edge, axis=1)
+    t = np.divide(
+        np.sum(delta * edge, axis=-1),
+        squared_length,
+        out=np.zeros(delta.shape[:-1]),
+        where=squared_length > 0.0,
+    )
+    closest = delta - np.clip(t, 0.0, 1.0)[..., None] * edge
+    return np.hypot(closest[..., 0], closest[..., 1]).min(axis=1)
+
+
+def random_track(rng: np.random.Generator) -> Track:
+    """
+    Generates a track with independent random right and left widths at each point,
+    around a loop whose radius is perturbed by a few harmonics, sampled at a random
+    number of points (from a few, with sharp corners where the boundaries fold) and
+    either closed or open (without the segment from the last to the first point).
+    """
+    n_points = int(rng.integers(4, 120))
+    theta = np.sort(rng.uniform(0.0, 2.0 * np.pi, n_points))
+    k = np.arange(2, 5)[:, None]
+    amplitude = rng.uniform(0.0, 0.2, (3, 1))
+    phase = rng.uniform(0.0, 2.0 * np.pi, (3, 1))
+    radius = rng.uniform(3.0, 30.0) * (
+        1.0 + np.sum(amplitude * np.cos(k * theta + phase), axis=0)
+    )
+    center_line = radius[:, None] * np.column_stack((np.cos(theta), np.sin(theta)))
+    track_widths = rng.uniform(0.2, 4.0, (n_points, 2))
+    no_cones = np.empty((0, 2))
+    return Track.from_arrays(
+        "random",
+        make_cone_table(no_cones, no_cones, no_cones, no_cones),
+        center_line,
+        track_widths,
+        closed=bool(rng.integers(2)),
+    )
+
+
+def sample_points(track: Track, n_points: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Samples half of the points uniformly around the track and half close to its
+    boundaries, where the cells of the grid are the hardest to classify.
+    """
+    reach = track.track_widths.max() + 2.0
+    low = track.center_line.min(axis=0) - reach
+    high = track.center_line.max(axis=0) + reach
+    uniform = rng.uniform(low, high, (n_points // 2, 2))
+    boundaries = np.concatenate((track.left_boundary, track.right_boundary))
+    idx = rng.integers(0, boundaries.shape[0], n_points - n_points // 2)
+    near = boundaries[idx] + rng.normal(0.0, 0.2, (idx.shape[0], 2))
+    return np.concatenate((uniform, near))
+
+
+def check(track: Track, points: np.ndarray) -> tuple:
+    """
+    Compares Track.contains() to the reference on the points, and returns the numbers
+    of points inside and of mismatches, and the throughput of Track.contains().
+    """
+    start = perf_counter()
+    inside = track.contains(points)
+    elapsed = perf_counter() - start
+    # only points on an edge (up to rounding errors) may be classified differently
+    mismatch = inside != reference_contains(track, points)
+    assert np.all(edge_distance(track, points[mismatch]) < 1e-9), track.name
+    return (
+        np.count_nonzero(inside),
+        np.count_nonzero(mismatch),
+        points.shape[0] / elapsed / 1e6,
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_track_area")
+    parser.add_argument("--n_points", type=int, default=100000)
+    parser.add_argument("--tracks", type=str, nargs="+", default=available_tracks)
+    parser.add_argument("--n_random", type=int, default=300)
+    parser.add_argument("--n_random_points", type=int, default=5000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    # a point beyond an outer corner, on the side of the narrow width
+    no_cones = np.empty((0, 2))
+    square = Track.from_arrays(
+        "square",
+        make_cone_table(no_cones, no_cones, no_cones, no_cones),
+        np.array([[0.0, 0.0], [20.0, 0.0], [20.0, 20.0], [0.0, 20.0]]),
+        np.array([[3.3, 3.3], [2.3, 1.5], [0.7, 1.8], [1.9, 0.7]]),
+        closed=True,
+    )
+    assert not square.contains([[21.5, 20.0]])
+
+    for name in args.tracks:
+        track = load_track(name)
+        n_inside, n_mismatches, throughput = check(
+            track, sample_points(track, args.n_points, rng)
+        )
+        print(
+            f"{name:>24}: {n_inside:>7} / {args.n_points} inside, "
+            f"{n_mismatches} mismatches, {throughput:6.2f} M points/s"
+        )
+
+    n_mismatches = 0
+    for _ in range(args.n_random):
+        track = random_track(rng)
+        n_mismatches += check(track, sample_points(track, args.n_random_points, rng))[1]
+    print(
+        f"{args.n_random} random tracks with asymmetric widths: "
+        f"{n_mismatches} mismatches"
+    )
@@ -0,0 +1,113 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+import shapely
+
+from track_database import *
+
+
+def footprint_distances(
+    track: Track,
+    trajectories: np.ndarray,
+    length: float,
+    width: float,
+    center_offset: float,
+) -> np.ndarray:
+    """
+    Reference implementation of the hit test of Track.trajectory_collisions(): returns
+    the (B, T, M) array of the distances between the rectangular footprints of the
+    vehicle along a (B, T, 3) array of trajectories and all the M cones, computed by
+    shapely between polygons and points.
+    """
+    cos_yaw = np.cos(trajectories[..., 2])[..., None]
+    sin_yaw = np.sin(trajectories[..., 2])[..., None]
+    # corners in the frame of the vehicle, then in the world frame
+    x = center_offset + 0.5 * length * np.array([1.0, -1.0, -1.0, 1.0])
+    y = 0.5 * width * np.array([1.0, 1.0, -1.0, -1.0])
+    corners = np.stack(
+        (
+            trajectories[..., 0, None] + cos_yaw * x - sin_yaw * y,
+            trajectories[..., 1, None] + sin_yaw * x + cos_yaw * y,
+        ),
+        axis=-1,
+    )
+    footprints = shapely.polygons(corners)
+    cones = shapely.points(track.cones["xy"])
+    return shapely.distance(footprints[..., None], cones)
+
+
+def sample_trajectories(
+    track: Track, n_trajectories: int, n_steps: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Samples trajectories following the center line with random lateral offsets
+    reaching beyond the track boundaries and random yaw errors, so that some of them
+    hit cones.
+    """
+    n_points = track.center_line.shape[0]
+    start = rng.integers(0, n_points, n_trajectories)
+    idx = start[:, None] + np.arange(n_steps)
+    idx = idx % n_points if track.is_closed else np.minimum(idx, n_points - 1)
+    reach = 1.2 * track.track_widths[start].max(axis=1)
+    offset = rng.uniform(-reach, reach)[:, None] + np.cumsum(
+        rng.normal(0.0, 0.05, (n_trajectories, n_steps)), axis=1
+    )
+    heading = track.heading[idx]
+    trajectories = np.empty((n_trajectories, n_steps, 3))
+    trajectories[..., 0] = track.center_line[idx, 0] - offset * np.sin(heading)
+    trajectories[..., 1] = track.center_line[idx, 1] + offset * np.cos(heading)
+    trajectories[..., 2] = heading + rng.normal(0.0, 0.1, (n_trajectories, n_steps))
+    return trajectories
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser("bench_trajectory_collisions")
+    parser.add_argument("--n_trajectories", type=int, default=64)
+    parser.add_argument("--n_steps", type=int, default=50)
+    parser.add_argument("--tracks", type=str, nargs="+", default=available_tracks)
+    args = parser.parse_args()
+    length, width, cone_radius, center_offset = 2.9, 1.4, 0.15, 0.8
+    rng = np.random.default_rng(0)
+    for name in args.tracks:
+        track = load_track(name)
+        trajectories = sample_trajectories(
+            track, args.n_trajectories, args.n_steps, rng
+        )
+        # warm up (building the cone index) before the timings
+        track.trajectory_collisions(trajectories[:1], length, width)
+        start = perf_counter()
+        distances = footprint_distances(
+            track, trajectories, length, width, center_offset
+        )
+        reference = perf_counter() - start
+        start = perf_counter()
+        collisions = track.trajectory_collisions(
+            trajectories, length, width, cone_radius, center_offset
+        )
+        current = perf_counter() - start
+
+        n_mismatches = 0
+        for b in range(args.n_trajectories):
+            hit = distances[b] <= cone_radius
+            # only the cones at the distance cone_radius of a footprint (up to
+            # rounding errors) may be classified differently
+            ambiguous = np.abs(distances[b] - cone_radius) < 1e-9
+            hit_steps = np.where(hit, np.arange(args.n_steps)[:, None], args.n_steps)
+            expected = dict(enumerate(hit_steps.min(axis=0)))
+            expected = {i: t for i, t in expected.items() if t < args.n_steps}
+            rows = slice(collisions.offsets[b], collisions.offsets[b + 1])
+            actual = dict(zip(collisions.indices[rows], collisions.times[rows]))
+            assert np.all(np.diff(collisions.times[rows]) >= 0), name
+            for i in expected.keys() | actual.keys():
+                if expected.get(i) != actual.get(i):
+                    assert np.any(ambiguous[:, i]), name
+                    n_mismatches += 1
+            assert collisions.first_hit[b] == min(actual.values(), default=-1), name
+        print(
+            f"{name:>24}: {np.count_nonzero(collisions.first_hit >= 0):>3} / "
+            f"{args.n_trajectories} trajectories collide, {n_mismatches} mismatches, "
+            f"shapely {1000 * reference:8.2f} ms, trajectory_collisions "
+            f"{1000 * current:6.2f} ms"
+        )
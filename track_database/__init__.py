@@ -1,2 +1,25 @@
 # Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
 from .tracks import *
+from .shared import *
+from .track_set import *
+from .progress import *
+from .horizon import *
+
+# The following features depend on heavy packages (shapely, scipy, pandas, dict2xml,
+# matplotlib) and are only imported on first access to keep `import track_database`
+# cheap.
+_lazy_attributes = {
+    "Mode": "track_generator",
+    "TrackGenerator": "track_generator",
+    "TrackGenerationError": "track_generator",
+    "TrackParser": "export_as_world",
+}
+
+
+def __getattr__(name: str):
+    if name in _lazy_attributes:
+        from importlib import import_module
+
+        module = import_module("." + _lazy_attributes[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,215 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import numpy as np
+
+try:
+    from .geometry import *
+except ImportError:
+    from geometry import *
+
+__all__ = ["TrackArea"]
+
+# codes of the cells of the grid that are not boundary cells
+_OUTSIDE = -1
+_INSIDE = -2
+
+
+def _cells_in_boxes(cell_min: np.ndarray, cell_max: np.ndarray) -> tuple:
+    """
+    Enumerates the cells of K boxes of cells, given by the (K, 2) arrays of the
+    (column, row) indices of their first and last cells. Returns the index of the box,
+    the column and the row of each (box, cell) pair.
+    """
+    n_cells = cell_max - cell_min + 1
+    counts = n_cells[:, 0] * n_cells[:, 1]
+    box = np.repeat(np.arange(counts.shape[0]), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    col = cell_min[box, 0] + local % n_cells[box, 0]
+    row = cell_min[box, 1] + local // n_cells[box, 0]
+    return box, col, row
+
+
+class TrackArea:
+    """
+    Drivable area of a track, i.e. the region between its left and right boundaries
+    (see geometry.center_line_geometry()). It is the union over all the center line
+    segments of two quadrilaterals, one on each side, between the segment and the
+    boundary points at its ends. Each side is thus only bounded by its own track
+    widths, and the areas of consecutive segments meet along the normals of the center
+    line at its points. Open center lines are cut flat at their first and last points,
+    closed ones include the segment from the last to the first point. Where a boundary
+    folds (track width larger than the radius of curvature, or center line
+    overlapping itself), the quadrilaterals are still all included.
+
+    Membership queries are accelerated by a uniform grid: each cell crossed by an edge
+    that can be on the boundary of the area is a boundary cell, whose points are
+    tested exactly against the few quadrilaterals overlapping it, and any other cell
+    is entirely inside or outside, as its center.
+    """
+
+    def __init__(
+        self,
+        center_line: np.ndarray,
+        track_widths: np.ndarray,
+        closed: bool,
+        resolution: float = 0.5,
+    ):
+        """
+        Args:
+            center_line: (N, 2) array of center line points.
+            track_widths: (N, 2) array of (right, left) track widths.
+            closed: whether the center line is a closed loop.
+            resolution: size of the cells of the acceleration grid in meters.
+        """
+        geometry = center_line_geometry(center_line, track_widths, closed)
+        left, right = geometry["left_boundary"], geometry["right_boundary"]
+        n_points = center_line.shape[0]
+        n_segments = n_points if closed else n_points - 1
+        i = np.arange(n_segments)
+        j = (i + 1) % n_points
+        # (2 * n_segments, 4, 2) array of the vertices of the quadrilaterals, the left
+        # ones first, counterclockwise unless folded
+        quads = np.concatenate(
+            (
+                np.stack((center_line[i], center_line[j], left[j], left[i]), axis=1),
+                np.stack((center_line[i], right[i], right[j], center_line[j]), axis=1),
+            )
+        )
+        end = np.roll(quads, -1, axis=1)
+        edges = end - quads
+        self.closed = closed
+        self.resolution = resolution
+        # the edges going upwards from their lowest end, so that an edge shared by two
+        # quadrilaterals is represented by the same numbers in both
+        upward = edges[..., 1:] >= 0.0
+        self._low = np.where(upward, quads, end)
+        self._up = np.where(upward, end, quads) - self._low
+
+        # the edges shared by two convex counterclockwise quadrilaterals are inside the
+        # area, so only the boundary and end edges of these can be on the boundary of
+        # the area, but any edge of the other (folded) ones can
+        turn = edges[:, :, 0] * np.roll(edges[:, :, 1], -1, axis=1) - edges[
+            :, :, 1
+        ] * np.roll(edges[:, :, 0], -1, axis=1)
+        signed_area = np.sum(
+            quads[:, :, 0] * np.roll(quads[:, :, 1], -1, axis=1)
+            - quads[:, :, 1] * np.roll(quads[:, :, 0], -1, axis=1),
+            axis=1,
+        )
+        on_boundary = np.zeros((quads.shape[0], 4), dtype=bool)
+        on_boundary[~(np.all(turn >= 0.0, axis=1) & (signed_area > 0.0))] = True
+        on_boundary[:n_segments, 2] = True
+        on_boundary[n_segments:, 1] = True
+        if not closed:
+            on_boundary[[0, n_segments], [3, 0]] = True
+            on_boundary[[n_segments - 1, 2 * n_segments - 1], [1, 2]] = True
+        boundary_start = quads[on_boundary]
+        boundary_direction = edges[on_boundary]
+
+        # bounding boxes of the quadrilaterals
+        box_min = quads.min(axis=1)
+        box_max = quads.max(axis=1)
+        self.origin = box_min.min(axis=0) - resolution
+        cell_min = np.floor((box_min - self.origin) / resolution).astype(np.intp)
+        cell_max = np.floor((box_max - self.origin) / resolution).astype(np.intp)
+        # (n_rows, n_cols)
+        self.shape = tuple(int(n) for n in cell_max.max(axis=0)[::-1] + 2)
+
+        # the boundary cells are the ones whose center is within half a diagonal of a
+        # boundary edge (which includes all the cells it crosses)
+        edge_min = np.minimum(boundary_start, boundary_start + boundary_direction)
+        edge_max = np.maximum(boundary_start, boundary_start + boundary_direction)
+        edge, col, row = _cells_in_boxes(
+            np.floor((edge_min - self.origin) / resolution).astype(np.intp),
+            np.floor((edge_max - self.origin) / resolution).astype(np.intp),
+        )
+        centers = self.origin + (np.column_stack((col, row)) + 0.5) * resolution
+        delta = centers - boundary_start[edge]
+        direction = boundary_direction[edge]
+        squared_length = np.sum(direction * direction, axis=1)
+        t = np.divide(
+            np.sum(delta * direction, axis=1),
+            squared_length,
+            out=np.zeros(edge.shape[0]),
+            where=squared_length > 0.0,
+        )
+        np.clip(t, 0.0, 1.0, out=t)
+        distance = np.hypot(*(delta - t[:, None] * direction).T)
+        crossed = distance <= (0.5 + 1e-9) * np.sqrt(2.0) * resolution
+        boundary_cells = np.unique(row[crossed] * self.shape[1] + col[crossed])
+
+        # all the (cell, quadrilateral) pairs such that the cell overlaps the bounding
+        # box of the quadrilateral, the other cells are outside
+        pair_quad, pair_col, pair_row = _cells_in_boxes(cell_min, cell_max)
+        pair_cell = pair_row * self.shape[1] + pair_col
+        centers = self.origin + (np.column_stack((pair_col, pair_row)) + 0.5) * (
+            resolution
+        )
+        inside_cells = pair_cell[self._in_quads(centers, pair_quad)]
+
+        grid = np.full(self.shape[0] * self.shape[1], _OUTSIDE, dtype=np.int32)
+        grid[inside_cells] = _INSIDE
+        grid[boundary_cells] = np.arange(boundary_cells.shape[0], dtype=np.int32)
+        self._grid = grid.reshape(self.shape)
+
+        # candidate quadrilaterals of the boundary cells, padded with -1
+        in_boundary = grid[pair_cell] >= 0
+        pair_cell, pair_quad = pair_cell[in_boundary], pair_quad[in_boundary]
+        order = np.argsort(pair_cell, kind="stable")
+        pair_cell, pair_quad = pair_cell[order], pair_quad[order]
+        first = np.searchsorted(pair_cell, boundary_cells)
+        counts = np.diff(np.append(first, pair_cell.shape[0]))
+        self._candidates = np.full(
+            (boundary_cells.shape[0], max(1, counts.max(initial=0))), -1, dtype=np.intp
+        )
+        rank = np.arange(pair_cell.shape[0]) - np.repeat(first, counts)
+        self._candidates[
+            np.repeat(np.arange(boundary_cells.shape[0]), counts), rank
+        ] = pair_quad
+
+    def _in_quads(self, points: np.ndarray, quad: np.ndarray) -> np.ndarray:
+        """
+        Tests, for each point and the quadrilateral of the same index (quad can also
+        have shape (N, M) to test M quadrilaterals per point), whether the point is
+        inside the quadrilateral, by counting the crossings of its edges with a ray
+        from the point towards +x. Points exactly on an edge may go either way.
+        """
+        if quad.ndim == 2:
+            points = points[:, None, :]
+        low = self._low[quad]
+        up = self._up[quad]
+        dx = points[..., 0, None] - low[..., 0]
+        dy = points[..., 1, None] - low[..., 1]
+        # the ray crosses the edges that straddle its line strictly on the right of the
+        # point, which gives the same answer for the two copies of a shared edge, so
+        # that the points on it are inside exactly one of the two quadrilaterals
+        straddle = (dy >= 0.0) & (dy < up[..., 1])
+        right = up[..., 0] * dy - up[..., 1] * dx > 0.0
+        crossings = np.count_nonzero(straddle & right, axis=-1)
+        return crossings % 2 == 1
+
+    def contains(self, points: np.ndarray) -> np.ndarray:
+        """
+        Tests whether the points of an (..., 2) array are inside the area. Returns a
+        boolean array of shape points.shape[:-1].
+        """
+        points = np.asarray(points, dtype=np.float64)
+        batch_shape = points.shape[:-1]
+        points = points.reshape(-1, 2)
+        cell = np.floor((points - self.origin) / self.resolution)
+        in_grid = (
+            (cell[:, 0] >= 0)
+            & (cell[:, 0] < self.shape[1])
+            & (cell[:, 1] >= 0)
+            & (cell[:, 1] < self.shape[0])
+        )
+        codes = np.full(points.shape[0], _OUTSIDE, dtype=np.int32)
+        cell = cell[in_grid].astype(np.intp)
+        codes[in_grid] = self._grid[cell[:, 1], cell[:, 0]]
+
+        result = codes == _INSIDE
+        boundary = np.flatnonzero(codes >= 0)
+        if boundary.size > 0:
+            candidates = self._candidates[codes[boundary]]
+            inside = self._in_quads(points[boundary], np.maximum(candidates, 0))
+            result[boundary] = np.any(inside & (candidates >= 0), axis=1)
+        return result.reshape(batch_shape)
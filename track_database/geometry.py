@@ -0,0 +1,409 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from collections import namedtuple
+from typing import Optional
+
+import numpy as np
+
+try:
+    from .utils import polyline_length
+except ImportError:
+    from utils import polyline_length
+
+__all__ = [
+    "GEOMETRY_DTYPE",
+    "center_line_geometry",
+    "Segments",
+    "FrenetProjection",
+    "polyline_segments",
+    "project_on_segments",
+    "project_on_candidate_segments",
+    "interpolate_polyline",
+    "sample_polyline",
+    "Decimation",
+    "decimate_polyline",
+]
+
+# maximum number of point-segment pairs processed at once by project_on_segments()
+_CHUNK_SIZE = 1 << 20
+
+# geometry of each point of a center line, see center_line_geometry()
+GEOMETRY_DTYPE = np.dtype(
+    [
+        ("s", np.float64),
+        ("heading", np.float64),
+        ("curvature", np.float64),
+        ("left_boundary", np.float64, (2,)),
+        ("right_boundary", np.float64, (2,)),
+    ]
+)
+
+Segments = namedtuple(
+    "Segments", ["start", "direction", "length", "inv_squared_length", "s", "heading"]
+)
+Segments.__doc__ = """
+Precomputed geometry of the K segments of a polyline:
+    start: (K, 2) array of the first points of the segments
+    direction: (K, 2) array of the vectors from the first to the last points
+    length: (K,) array of the lengths of the segments
+    inv_squared_length: (K,) array of the inverse squared lengths (0 for segments of
+        length 0)
+    s: (K,) array of the arc lengths of the first points of the segments
+    heading: (K,) array of the headings of the segments
+"""
+
+FrenetProjection = namedtuple("FrenetProjection", ["s", "d", "segment", "heading"])
+FrenetProjection.__doc__ = """
+Projection of points onto a polyline:
+    s: arc length of the projected points
+    d: signed lateral offset of the points (positive on the left of the polyline)
+    segment: index of the segment on which the points are projected
+    heading: heading of this segment
+"""
+
+Decimation = namedtuple("Decimation", ["indices", "segment", "max_error", "reduction"])
+Decimation.__doc__ = """
+Result of the decimation of a polyline of N points (see decimate_polyline()):
+    indices: sorted indices of the kept points in the original polyline
+    segment: (N,) array of the index of the segment of the decimated polyline
+        approximating each original point (i.e. of the last kept point before it)
+    max_error: maximum error between the removed points and the decimated polyline
+    reduction: fraction of the points that were removed
+"""
+
+
+def polyline_segments(points: np.ndarray, closed: bool) -> Segments:
+    """
+    Computes the geometry of the segments of the polyline defined by points (array of
+    shape (N, 2)). If closed is True, the polyline has an additional segment from the
+    last to the first point.
+    """
+    if points.shape[0] < 2:
+        raise ValueError("A polyline needs at least 2 points")
+    end = np.roll(points, -1, axis=0) if closed else points[1:]
+    start = points if closed else points[:-1]
+    direction = end - start
+    length = np.hypot(direction[:, 0], direction[:, 1])
+    inv_squared_length = np.divide(
+        1.0, length**2, out=np.zeros_like(length), where=length > 0.0
+    )
+    s = np.concatenate(([0.0], np.cumsum(length[:-1])))
+    heading = np.arctan2(direction[:, 1], direction[:, 0])
+    return Segments(start, direction, length, inv_squared_length, s, heading)
+
+
+def project_on_segments(
+    points: np.ndarray, segments: Segments, closed: bool
+) -> FrenetProjection:
+    """
+    Projects points (array of shape (..., 2)) onto the polyline whose segments are
+    given, by finding the closest segment of each point. The returned arrays have the
+    shape points.shape[:-1].
+    On a closed polyline, s lies in [0, total length). On an open polyline, points
+    lying before the first or after the last point are projected onto the extensions
+    of the first and last segments, so s can be negative or larger than the total
+    length.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    batch_shape = points.shape[:-1]
+    points = points.reshape(-1, 2)
+    n_segments = segments.length.shape[0]
+
+    # bounds of the normalized position along each segment
+    t_min = np.zeros(n_segments)
+    t_max = np.ones(n_segments)
+    if not closed:
+        t_min[0] = -np.inf
+        t_max[-1] = np.inf
+
+    start_x, start_y = segments.start.T
+    direction_x, direction_y = segments.direction.T
+    segment = np.empty(points.shape[0], dtype=np.intp)
+    t = np.empty(points.shape[0])
+    chunk = max(1, _CHUNK_SIZE // n_segments)
+    for i in range(0, points.shape[0], chunk):
+        # (n, K) arrays of the vectors from the segment starts to the points
+        dx = points[i : i + chunk, 0, None] - start_x
+        dy = points[i : i + chunk, 1, None] - start_y
+        t_chunk = dx * direction_x
+        t_chunk += dy * direction_y
+        t_chunk *= segments.inv_squared_length
+        np.clip(t_chunk, t_min, t_max, out=t_chunk)
+        # vectors from the closest points on the segments to the points
+        dx -= t_chunk * direction_x
+        dy -= t_chunk * direction_y
+        dx *= dx
+        dy *= dy
+        dx += dy
+        segment_chunk = np.argmin(dx, axis=1)
+        segment[i : i + chunk] = segment_chunk
+        t[i : i + chunk] = t_chunk[np.arange(segment_chunk.shape[0]), segment_chunk]
+
+    return _frenet_coordinates(points, segments, segment, t, closed, batch_shape)
+
+
+def project_on_candidate_segments(
+    points: np.ndarray, segments: Segments, candidates: np.ndarray, closed: bool
+) -> FrenetProjection:
+    """
+    Same as project_on_segments() for an (N, 2) array of points, but only considers,
+    for each point, the segments whose indices are given in the corresponding row of
+    the (N, M) array candidates. The cost is O(N * M) instead of O(N * K).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n_segments = segments.length.shape[0]
+    start = segments.start[candidates]
+    direction = segments.direction[candidates]
+    dx = points[:, 0, None] - start[..., 0]
+    dy = points[:, 1, None] - start[..., 1]
+    t = dx * direction[..., 0]
+    t += dy * direction[..., 1]
+    t *= segments.inv_squared_length[candidates]
+    if closed:
+        np.clip(t, 0.0, 1.0, out=t)
+    else:
+        # extend the first and last segments of open polylines
+        t_min = np.where(candidates == 0, -np.inf, 0.0)
+        t_max = np.where(candidates == n_segments - 1, np.inf, 1.0)
+        np.clip(t, t_min, t_max, out=t)
+    dx -= t * direction[..., 0]
+    dy -= t * direction[..., 1]
+    best = np.argmin(dx * dx + dy * dy, axis=1)
+    rows = np.arange(points.shape[0])
+    return _frenet_coordinates(
+        points,
+        segments,
+        candidates[rows, best],
+        t[rows, best],
+        closed,
+        points.shape[:-1],
+    )
+
+
+def _frenet_coordinates(
+    points: np.ndarray,
+    segments: Segments,
+    segment: np.ndarray,
+    t: np.ndarray,
+    closed: bool,
+    batch_shape: tuple,
+) -> FrenetProjection:
+    """
+    Computes the Frenet coordinates of points (array of shape (N, 2)) given the
+    segments on which they are projected and their normalized positions t along them.
+    """
+    start = segments.start[segment]
+    direction = segments.direction[segment]
+    delta = points - start
+    projected = start + t[:, None] * direction
+    d = np.hypot(*(points - projected).T)
+    cross = direction[:, 0] * delta[:, 1] - direction[:, 1] * delta[:, 0]
+    d = np.where(cross < 0.0, -d, d)
+
+    s = segments.s[segment] + t * segments.length[segment]
+    if closed:
+        total_length = segments.s[-1] + segments.length[-1]
+        s = np.where(s >= total_length, s - total_length, s)
+
+    return FrenetProjection(
+        s.reshape(batch_shape),
+        d.reshape(batch_shape),
+        segment.reshape(batch_shape),
+        segments.heading[segment].reshape(batch_shape),
+    )
+
+
+def center_line_geometry(
+    center_line: np.ndarray, track_widths: np.ndarray, closed: bool
+) -> np.ndarray:
+    """
+    Computes the geometry of each point of a center line (array of shape (N, 2)) with
+    the given (right, left) track widths (array of shape (N, 2)), as an array of dtype
+    GEOMETRY_DTYPE with the fields:
+        s: cumulative arc length from the first point
+        heading: heading of the center line, estimated by central differences
+            (one-sided at the ends of open center lines)
+        curvature: derivative of the heading with respect to the arc length,
+            estimated by central differences
+        left_boundary: point at a distance left_width on the left of the point
+        right_boundary: point at a distance right_width on the right of the point
+    On closed center lines the differences wrap around the ends.
+    """
+    n_points = center_line.shape[0]
+    if n_points < 2:
+        raise ValueError("A center line needs at least 2 points")
+    geometry = np.empty(n_points, dtype=GEOMETRY_DTYPE)
+    segment_lengths = np.hypot(*np.diff(center_line, axis=0).T)
+    geometry["s"][0] = 0.0
+    np.cumsum(segment_lengths, out=geometry["s"][1:])
+
+    if closed:
+        previous_idx = np.roll(np.arange(n_points), 1)
+        next_idx = np.roll(np.arange(n_points), -1)
+        length = geometry["s"][-1] + np.hypot(*(center_line[0] - center_line[-1]))
+    else:
+        previous_idx = np.maximum(np.arange(n_points) - 1, 0)
+        next_idx = np.minimum(np.arange(n_points) + 1, n_points - 1)
+        length = geometry["s"][-1]
+
+    delta = center_line[next_idx] - center_line[previous_idx]
+    heading = np.arctan2(delta[:, 1], delta[:, 0])
+    geometry["heading"] = heading
+
+    # arc length between the neighbours of each point, wrapping around on closed
+    # center lines
+    ds = geometry["s"][next_idx] - geometry["s"][previous_idx]
+    if closed:
+        ds[[0, -1]] += length
+    dheading = np.angle(np.exp(1j * (heading[next_idx] - heading[previous_idx])))
+    geometry["curvature"] = np.divide(
+        dheading, ds, out=np.zeros(n_points), where=ds > 0.0
+    )
+
+    normal = np.column_stack((-np.sin(heading), np.cos(heading)))
+    geometry["left_boundary"] = center_line + normal * track_widths[:, 1, None]
+    geometry["right_boundary"] = center_line - normal * track_widths[:, 0, None]
+    return geometry
+
+
+def interpolate_polyline(
+    points: np.ndarray, values: np.ndarray, closed: bool, s: np.ndarray
+) -> np.ndarray:
+    """
+    Interpolates linearly the values (array of shape (N, C)) attached to the points of
+    a polyline (array of shape (N, 2)) at the arc lengths s (array of shape (M,)).
+    On closed polylines s is taken modulo the total length and the last segment
+    interpolates between the values of the last and first points, on open ones s is
+    clipped to the ends. Returns an array of shape (M, C).
+    """
+    if closed:
+        points = np.concatenate((points, points[:1]))
+        values = np.concatenate((values, values[:1]))
+    segment_lengths = np.hypot(*np.diff(points, axis=0).T)
+    knots = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+    s = np.asarray(s, dtype=np.float64)
+    s = np.mod(s, knots[-1]) if closed else np.clip(s, 0.0, knots[-1])
+    segment = np.clip(
+        np.searchsorted(knots, s, side="right") - 1, 0, segment_lengths.shape[0] - 1
+    )
+    t = np.divide(
+        s - knots[segment],
+        segment_lengths[segment],
+        out=np.zeros_like(s),
+        where=segment_lengths[segment] > 0.0,
+    )
+    return values[segment] + t[:, None] * (values[segment + 1] - values[segment])
+
+
+def sample_polyline(
+    points: np.ndarray,
+    closed: bool,
+    spacing: float,
+    values: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Places points evenly in arc length along a polyline (array of shape (N, 2)), e.g.
+    cones along a track boundary: the polyline is split into ceil(length / spacing)
+    intervals of equal length, so that consecutive points are at most spacing apart
+    along the polyline. The first point is the first point of the polyline, and on
+    open polylines the last point is the last point of the polyline.
+    If values (array of shape (N, C)) is given, returns the values interpolated at the
+    placed points instead of their positions.
+    """
+    if spacing <= 0.0:
+        raise ValueError(f"spacing must be positive, got {spacing}")
+    length = polyline_length(points, closed)
+    n_intervals = max(1, int(np.ceil(length / spacing)))
+    s = np.linspace(0.0, length, n_intervals + 1)
+    if closed:
+        s = s[:-1]
+    return interpolate_polyline(points, points if values is None else values, closed, s)
+
+
+def decimate_polyline(
+    points: np.ndarray,
+    closed: bool,
+    tolerance: float,
+    widths: Optional[np.ndarray] = None,
+) -> Decimation:
+    """
+    Simplifies a polyline (array of shape (N, 2)) with the Douglas-Peucker algorithm:
+    a point is kept if its error exceeds tolerance, the error being its distance to
+    the segment between the surrounding kept points and, if widths (array of shape
+    (N, C), e.g. track widths) is given, the deviation of its widths from the ones
+    interpolated along that segment. All the intervals of a level of the recursion
+    are processed together, in a few vectorized operations per level.
+    Closed polylines keep at least 3 points, open ones at least their ends.
+    """
+    n_points = points.shape[0]
+    if widths is None:
+        widths = np.zeros((n_points, 0))
+    if closed:
+        # the first point is repeated at the end, and the initial points are the first
+        # one, the farthest one from it and the farthest one from the line between
+        # them
+        points = np.concatenate((points, points[:1]))
+        widths = np.concatenate((widths, widths[:1]))
+        far = int(np.argmax(np.hypot(*(points[:-1] - points[0]).T)))
+        direction = points[far] - points[0]
+        delta = points[:-1] - points[0]
+        third = int(
+            np.argmax(np.abs(direction[0] * delta[:, 1] - direction[1] * delta[:, 0]))
+        )
+        initial = np.unique([0, far, third, n_points])
+    else:
+        initial = np.array([0, n_points - 1])
+    keep = np.zeros(points.shape[0], dtype=bool)
+    keep[initial] = True
+    x, y = np.ascontiguousarray(points[:, 0]), np.ascontiguousarray(points[:, 1])
+    widths = np.ascontiguousarray(widths.T)
+    # the points still to be tested, with the ends of the interval containing them
+    idx = np.flatnonzero(~keep[initial[0] : initial[-1]]) + initial[0]
+    position = np.searchsorted(initial, idx)
+    start, end = initial[position - 1], initial[position]
+    max_error = 0.0
+
+    while idx.shape[0] > 0:
+        ax, ay = x[start], y[start]
+        dx, dy = x[end] - ax, y[end] - ay
+        px, py = x[idx] - ax, y[idx] - ay
+        squared_length = dx * dx + dy * dy
+        t = np.divide(
+            px * dx + py * dy,
+            squared_length,
+            out=np.zeros(idx.shape[0]),
+            where=squared_length > 0.0,
+        )
+        np.clip(t, 0.0, 1.0, out=t)
+        error = np.hypot(px - t * dx, py - t * dy)
+        for w in widths:
+            w_a = w[start]
+            np.maximum(error, np.abs(w[idx] - w_a - t * (w[end] - w_a)), out=error)
+
+        # the intervals are contiguous runs of idx, whose worst point is the first one
+        # with the largest error
+        first = np.flatnonzero(np.concatenate(([True], start[1:] != start[:-1])))
+        counts = np.diff(np.append(first, idx.shape[0]))
+        worst_error = np.maximum.reduceat(error, first)
+        position = np.where(
+            error == np.repeat(worst_error, counts),
+            np.arange(idx.shape[0]),
+            idx.shape[0],
+        )
+        worst = idx[np.minimum.reduceat(position, first)]
+        split = worst_error > tolerance
+        if np.any(~split):
+            max_error = max(max_error, float(worst_error[~split].max()))
+        keep[worst[split]] = True
+
+        # the points of the split intervals go to the half on their side of the worst
+        # point, the others are done
+        worst = np.repeat(np.where(split, worst, -1), counts)
+        left = idx < worst
+        active = (worst >= 0) & (idx != worst)
+        start = np.where(left, start, worst)[active]
+        end = np.where(left, worst, end)[active]
+        idx = idx[active]
+
+    indices = np.flatnonzero(keep[:n_points])
+    segment = np.searchsorted(indices, np.arange(n_points), side="right") - 1
+    return Decimation(indices, segment, max_error, 1.0 - indices.shape[0] / n_points)
@@ -0,0 +1,109 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from typing import Optional
+
+import numpy as np
+
+try:
+    from .tracks import *
+except ImportError:
+    from tracks import *
+
+__all__ = ["ReferenceHorizon", "REFERENCE_FIELDS"]
+
+# fields of the last axis of the reference windows returned by ReferenceHorizon
+REFERENCE_FIELDS = ("x", "y", "heading", "curvature", "right_width", "left_width")
+
+
+class ReferenceHorizon:
+    """
+    Extracts reference windows for model predictive controllers: n_points points of
+    the center line spaced by spacing (in arc length) starting at the current arc
+    length of each agent, with the heading, curvature and (right, left) track widths
+    at these points (see REFERENCE_FIELDS).
+
+    The values are linearly interpolated in a dense table sampled uniformly in arc
+    length from the spline of the track (see Track.spline) at construction. The
+    windows wrap around the end of closed tracks with modular indexing in the table
+    and stop at the end of open tracks. All the intermediate arrays are allocated
+    once, so calls writing into a caller-provided buffer do not allocate any array.
+    """
+
+    def __init__(
+        self,
+        track: Track,
+        n_points: int,
+        spacing: float,
+        n_agents: int = 1,
+        resolution: float = 0.1,
+    ):
+        """
+        Args:
+            track: track whose center line is followed.
+            n_points: number of points in each window.
+            spacing: arc length between two consecutive points of a window.
+            n_agents: number of agents whose windows are extracted together.
+            resolution: arc length between two entries of the table, rounded down so
+                that the length of the center line is a multiple of it.
+        """
+        spline = track.spline
+        self.track = track
+        self.n_points = n_points
+        self.spacing = spacing
+        self.n_agents = n_agents
+        self.closed = spline.closed
+        self.length = spline.length
+
+        n_entries = max(1, int(np.ceil(self.length / resolution)))
+        self.resolution = self.length / n_entries
+        s = np.linspace(0.0, self.length, n_entries + 1)
+        values = spline.eval(s)
+        table = np.empty((n_entries + 1, len(REFERENCE_FIELDS)))
+        table[:, :2] = values[:, :2]
+        # unwrapped to be interpolated, wrapped again after the interpolation
+        table[:, 2] = np.unwrap(spline.heading(s))
+        table[:, 3] = spline.curvature(s)
+        table[:, 4:] = values[:, 2:]
+        # each query is interpolated between the entries idx and idx + 1
+        self._table = table[:-1].copy()
+        self._delta = np.diff(table, axis=0)
+
+        shape = (n_agents, n_points)
+        self._offsets = np.arange(n_points) * spacing
+        self._u = np.empty(shape)
+        self._floor = np.empty(shape)
+        self._idx = np.empty(shape, dtype=np.intp)
+        self._scratch = np.empty(shape + (len(REFERENCE_FIELDS),))
+
+    def __call__(self, s0: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Returns the reference windows starting at the arc lengths s0 (array of shape
+        (n_agents,)) as an array of shape (n_agents, n_points, len(REFERENCE_FIELDS)),
+        written into out if it is given.
+        """
+        if out is None:
+            out = np.empty(self._scratch.shape)
+        u = self._u
+        idx = self._idx
+        np.add(np.reshape(s0, (self.n_agents, 1)), self._offsets, out=u)
+        if self.closed:
+            np.remainder(u, self.length, out=u)
+        else:
+            np.clip(u, 0.0, self.length, out=u)
+        u *= 1.0 / self.resolution
+        floor = self._floor
+        np.floor(u, out=floor)
+        np.minimum(floor, self._table.shape[0] - 1, out=floor)
+        np.copyto(idx, floor, casting="unsafe")
+        # fractional position between the entries idx and idx + 1
+        u -= floor
+
+        np.take(self._table, idx, axis=0, out=out, mode="clip")
+        np.take(self._delta, idx, axis=0, out=self._scratch, mode="clip")
+        self._scratch *= u[..., None]
+        out += self._scratch
+
+        heading = out[..., 2]
+        heading += np.pi
+        np.remainder(heading, 2 * np.pi, out=heading)
+        heading -= np.pi
+        return out
@@ -0,0 +1,140 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from collections import namedtuple
+from typing import Optional
+
+import numpy as np
+
+try:
+    from .geometry import *
+    from .tracks import *
+except ImportError:
+    from geometry import *
+    from tracks import *
+
+__all__ = ["ProgressTracker", "Progress"]
+
+Progress = namedtuple("Progress", ["s", "d", "segment", "laps", "distance"])
+Progress.__doc__ = """
+Progress of each agent along the center line:
+    s: arc length of the projected position in the current lap
+    d: signed lateral offset (positive on the left of the center line)
+    segment: index of the center line segment on which the position is projected
+    laps: number of completed laps (always 0 on open tracks)
+    distance: total distance travelled along the center line, laps * length + s
+"""
+
+
+class ProgressTracker:
+    """
+    Tracks the progress of one or several agents along the center line of a track.
+    The segment on which each agent was last projected is remembered and the next
+    projection only considers the segments in a small window around it, so that the
+    cost of an update does not depend on the length of the center line. An agent is
+    projected on the whole center line on its first update, and again whenever it
+    seems to have jumped (closest segment at the border of the window, or lateral
+    offset larger than max_offset).
+    On closed tracks, the laps are counted when s wraps around (backwards crossings
+    of the start line decrement the count).
+    """
+
+    def __init__(
+        self,
+        track: Track,
+        n_agents: int = 1,
+        window: int = 4,
+        max_offset: Optional[float] = None,
+    ):
+        """
+        Args:
+            track: track along which the agents progress.
+            n_agents: number of agents updated together.
+            window: number of segments searched before and after the last segment.
+            max_offset: lateral offset above which a global search is made, by
+                default twice the maximum track width.
+        """
+        self.track = track
+        self.n_agents = n_agents
+        self.window = window
+        self.max_offset = (
+            2 * float(np.max(np.sum(track.track_widths, axis=1)))
+            if max_offset is None
+            else max_offset
+        )
+        self._offsets = np.arange(-window, window + 1)
+        self.reset()
+
+    def reset(self, agents: Optional[np.ndarray] = None):
+        """
+        Forgets the state of the given agents (all agents by default), so that their
+        next update performs a global search and starts counting laps from 0.
+        """
+        if agents is None:
+            self.segment = np.full(self.n_agents, -1, dtype=np.intp)
+            self.s = np.zeros(self.n_agents)
+            self.laps = np.zeros(self.n_agents, dtype=int)
+        else:
+            self.segment[agents] = -1
+            self.s[agents] = 0.0
+            self.laps[agents] = 0
+
+    def update(self, positions: np.ndarray) -> Progress:
+        """
+        Updates the progress of the agents given their positions (array of shape
+        (n_agents, 2)).
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(self.n_agents, 2)
+        segments = self.track.segments
+        closed = self.track.is_closed
+        n_segments = segments.length.shape[0]
+
+        s = np.empty(self.n_agents)
+        d = np.empty(self.n_agents)
+        segment = np.empty(self.n_agents, dtype=np.intp)
+
+        # local search around the last segment of the initialized agents
+        local = np.flatnonzero(self.segment >= 0)
+        if local.size > 0:
+            candidates = self.segment[local, None] + self._offsets
+            if closed:
+                candidates %= n_segments
+            else:
+                np.clip(candidates, 0, n_segments - 1, out=candidates)
+            projection = project_on_candidate_segments(
+                positions[local], segments, candidates, closed
+            )
+            # the agent may be outside the window if the closest segment is on its
+            # border (except at the ends of open tracks)
+            on_border = (projection.segment == candidates[:, 0]) | (
+                projection.segment == candidates[:, -1]
+            )
+            if not closed:
+                on_border &= (projection.segment > 0) & (
+                    projection.segment < n_segments - 1
+                )
+            lost = on_border | (np.abs(projection.d) > self.max_offset)
+            s[local] = projection.s
+            d[local] = projection.d
+            segment[local] = projection.segment
+            global_search = np.concatenate(
+                (local[lost], np.flatnonzero(self.segment < 0))
+            )
+        else:
+            global_search = np.arange(self.n_agents)
+
+        if global_search.size > 0:
+            projection = self.track.project(positions[global_search])
+            s[global_search] = projection.s
+            d[global_search] = projection.d
+            segment[global_search] = projection.segment
+
+        if closed:
+            length = self.track.length
+            ds = s - self.s
+            initialized = self.segment >= 0
+            self.laps += initialized & (ds < -length / 2)
+            self.laps -= initialized & (ds > length / 2)
+
+        self.s = s
+        self.segment = segment
+        distance = self.laps * self.track.length + s if closed else s.copy()
+        return Progress(s.copy(), d, segment.copy(), self.laps.copy(), distance)
@@ -0,0 +1,282 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+try:
+    from .area import *
+except ImportError:
+    from area import *
+
+__all__ = ["TrackRaster", "rasterize_track", "default_cache_dir"]
+
+# version of the format of the cached rasters, to be incremented whenever the way they
+# are computed changes so that the stale files are not reused
+_RASTER_VERSION = 2
+
+# maximum number of cell centers tested at once against the drivable area
+_CHUNK_SIZE = 1 << 20
+
+
+def default_cache_dir() -> str:
+    """
+    Returns the directory where the rasters of the tracks are cached on disk,
+    $XDG_CACHE_HOME/track_database (by default ~/.cache/track_database).
+    """
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "track_database",
+    )
+
+
+class TrackRaster:
+    """
+    Rasterization of a track on a regular grid of square cells:
+        occupancy: (H, W) boolean array, True for the cells whose center is outside
+            the drivable area of the track or inside a cone
+        sdf: (H, W) float32 array, signed distance in meters from the center of each
+            cell to the boundary of the free space (positive in free space, negative
+            in occupied cells)
+        transform: (3, 3) affine transform mapping the homogeneous grid coordinates
+            (column, row, 1) of the cell corners to world coordinates (x, y, 1), i.e.
+            cell (i, j) covers [x0 + j * resolution, x0 + (j + 1) * resolution] x
+            [y0 + i * resolution, y0 + (i + 1) * resolution]
+    The arrays are read-only, and memory-mapped when loaded from the disk cache.
+    """
+
+    def __init__(self, occupancy: np.ndarray, sdf: np.ndarray, transform: np.ndarray):
+        self.occupancy = occupancy
+        self.sdf = sdf
+        self.transform = transform
+
+    @property
+    def resolution(self) -> float:
+        return float(self.transform[0, 0])
+
+    @property
+    def origin(self) -> np.ndarray:
+        return self.transform[:2, 2]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.occupancy.shape
+
+    def world_to_grid(self, points: np.ndarray) -> np.ndarray:
+        """
+        Converts world coordinates (array of shape (..., 2)) to continuous grid
+        coordinates (column, row), where the center of cell (i, j) is at (j, i).
+        """
+        points = np.asarray(points, dtype=np.float64)
+        return (points - self.origin) / self.resolution - 0.5
+
+    def sample(self, points: np.ndarray, field: str = "sdf") -> np.ndarray:
+        """
+        Interpolates bilinearly the sdf (or the occupancy, as a fraction in [0, 1]) at
+        the points of an (..., 2) array, between the centers of the cells. Points
+        outside the grid get the value of the closest cell of the border.
+        Returns an array of shape points.shape[:-1].
+        """
+        if field not in ("sdf", "occupancy"):
+            raise ValueError(f"field must be 'sdf' or 'occupancy', got {field}")
+        values = self.sdf if field == "sdf" else self.occupancy
+        n_rows, n_cols = values.shape
+        grid = self.world_to_grid(points)
+        col = np.clip(grid[..., 0], 0.0, n_cols - 1)
+        row = np.clip(grid[..., 1], 0.0, n_rows - 1)
+        col0 = np.minimum(col.astype(np.intp), n_cols - 2)
+        row0 = np.minimum(row.astype(np.intp), n_rows - 2)
+        fcol = col - col0
+        frow = row - row0
+        v00 = values[row0, col0]
+        v01 = values[row0, col0 + 1]
+        v10 = values[row0 + 1, col0]
+        v11 = values[row0 + 1, col0 + 1]
+        return (1.0 - frow) * ((1.0 - fcol) * v00 + fcol * v01) + frow * (
+            (1.0 - fcol) * v10 + fcol * v11
+        )
+
+
+def _content_hash(
+    cones_xy: np.ndarray,
+    center_line: np.ndarray,
+    track_widths: np.ndarray,
+    closed: bool,
+    resolution: float,
+    cone_radius: float,
+    padding: float,
+) -> str:
+    sha256 = hashlib.sha256()
+    sha256.update(
+        repr(
+            (
+                _RASTER_VERSION,
+                bool(closed),
+                float(resolution),
+                float(cone_radius),
+                float(padding),
+            )
+        ).encode()
+    )
+    for arr in (cones_xy, center_line, track_widths):
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        sha256.update(repr(arr.shape).encode())
+        sha256.update(arr.tobytes())
+    return sha256.hexdigest()
+
+
+def _save_atomic(path: str, arr: np.ndarray):
+    # write to a temporary file first so that concurrent processes never map a
+    # partially written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _compute_raster(
+    cones_xy: np.ndarray,
+    center_line: np.ndarray,
+    track_widths: np.ndarray,
+    closed: bool,
+    resolution: float,
+    cone_radius: float,
+    padding: float,
+) -> TrackRaster:
+    # imported here to keep scipy out of `import track_database`
+    from scipy.ndimage import distance_transform_edt
+
+    reach = track_widths.max()
+    box_min = center_line.min(axis=0) - reach
+    box_max = center_line.max(axis=0) + reach
+    if cones_xy.shape[0] > 0:
+        box_min = np.minimum(box_min, cones_xy.min(axis=0) - cone_radius)
+        box_max = np.maximum(box_max, cones_xy.max(axis=0) + cone_radius)
+    origin = box_min - padding
+    n_cols, n_rows = np.ceil((box_max + padding - origin) / resolution).astype(int) + 1
+
+    # free cells are the ones whose center is on the track
+    area = TrackArea(center_line, track_widths, closed)
+    free = np.empty(n_rows * n_cols, dtype=bool)
+    for start in range(0, n_rows * n_cols, _CHUNK_SIZE):
+        cell = np.arange(start, min(start + _CHUNK_SIZE, n_rows * n_cols))
+        centers = origin + (np.column_stack((cell % n_cols, cell // n_cols)) + 0.5) * (
+            resolution
+        )
+        free[cell] = area.contains(centers)
+    free = free.reshape(n_rows, n_cols)
+
+    # the cells whose center is inside a cone, and the cells containing the cones
+    # (cones smaller than a cell), are occupied
+    r = int(np.ceil(cone_radius / resolution)) + 1
+    offset_row, offset_col = np.divmod(np.arange((2 * r + 1) ** 2), 2 * r + 1)
+    cone_cell = np.floor((cones_xy - origin) / resolution).astype(np.intp)
+    cols = cone_cell[:, 0, None] + (offset_col - r)
+    rows = cone_cell[:, 1, None] + (offset_row - r)
+    dx = origin[0] + (cols + 0.5) * resolution - cones_xy[:, 0, None]
+    dy = origin[1] + (rows + 0.5) * resolution - cones_xy[:, 1, None]
+    in_cone = (dx * dx + dy * dy <= cone_radius**2) | (
+        (rows == cone_cell[:, 1, None]) & (cols == cone_cell[:, 0, None])
+    )
+    in_cone &= (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+    free[rows[in_cone], cols[in_cone]] = False
+
+    # distances between cell centers, shifted by half a cell so that the boundary is
+    # halfway between a free and an occupied cell
+    sdf = np.where(
+        free, distance_transform_edt(free) - 0.5, 0.5 - distance_transform_edt(~free)
+    )
+    sdf = (sdf * resolution).astype(np.float32)
+    transform = np.array(
+        [
+            [resolution, 0.0, origin[0]],
+            [0.0, resolution, origin[1]],
+            [0.0, 0.0, 1.0],
+        ]
+    )
+    return TrackRaster(~free, sdf, transform)
+
+
+def rasterize_track(
+    cones_xy: np.ndarray,
+    center_line: np.ndarray,
+    track_widths: np.ndarray,
+    closed: bool,
+    resolution: float = 0.1,
+    cone_radius: float = 0.15,
+    padding: float = 1.0,
+    use_cache: bool = True,
+    cache_dir: Optional[str] = None,
+) -> TrackRaster:
+    """
+    Rasterizes a track into an occupancy grid and a signed distance field (see
+    TrackRaster). The free space is the drivable area of the track (see TrackArea)
+    minus discs of radius cone_radius around the cones.
+
+    Args:
+        cones_xy: (M, 2) array of cone positions.
+        center_line: (N, 2) array of center line points.
+        track_widths: (N, 2) array of (right, left) track widths.
+        closed: whether the center line is a closed loop.
+        resolution: size of the cells in meters.
+        cone_radius: radius of the cones in meters.
+        padding: margin in meters added around the track on each side of the grid.
+        use_cache: whether to look up the raster in (and write it to) the disk cache,
+            where it is identified by a hash of the track content and of the above
+            parameters.
+        cache_dir: directory of the disk cache, by default default_cache_dir().
+    """
+    if resolution <= 0.0:
+        raise ValueError(f"resolution must be positive, got {resolution}")
+    cones_xy = np.asarray(cones_xy, dtype=np.float64).reshape(-1, 2)
+    center_line = np.asarray(center_line, dtype=np.float64)
+    track_widths = np.asarray(track_widths, dtype=np.float64)
+    if not use_cache:
+        raster = _compute_raster(
+            cones_xy,
+            center_line,
+            track_widths,
+            closed,
+            resolution,
+            cone_radius,
+            padding,
+        )
+        for arr in (raster.occupancy, raster.sdf, raster.transform):
+            arr.flags.writeable = False
+        return raster
+
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    key = _content_hash(
+        cones_xy, center_line, track_widths, closed, resolution, cone_radius, padding
+    )
+    paths = [
+        os.path.join(cache_dir, f"{key}_{field}.npy")
+        for field in ("occupancy", "sdf", "transform")
+    ]
+    # the transform is written last, so the raster is complete if it exists
+    if not os.path.exists(paths[2]):
+        raster = _compute_raster(
+            cones_xy,
+            center_line,
+            track_widths,
+            closed,
+            resolution,
+            cone_radius,
+            padding,
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+        for path, arr in zip(paths, (raster.occupancy, raster.sdf, raster.transform)):
+            _save_atomic(path, arr)
+    occupancy, sdf = (
+        np.load(path, mmap_mode="r").view(np.ndarray) for path in paths[:2]
+    )
+    transform = np.load(paths[2])
+    transform.flags.writeable = False
+    return TrackRaster(occupancy, sdf, transform)
@@ -0,0 +1,182 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import hashlib
+import json
+import os.path
+from collections import namedtuple
+from functools import lru_cache
+from typing import Callable, Optional
+
+import numpy as np
+
+try:
+    from .utils import *
+except ImportError:
+    from utils import *
+
+__all__ = [
+    "DATA_DIR",
+    "MANIFEST_FILE",
+    "TrackMetadata",
+    "build_manifest",
+    "write_manifest",
+    "load_manifest",
+    "track_metadata",
+    "find_tracks",
+]
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+MANIFEST_FILE = os.path.join(DATA_DIR, "manifest.json")
+MANIFEST_VERSION = 1
+
+TrackMetadata = namedtuple(
+    "TrackMetadata",
+    [
+        "name",
+        "cone_file",
+        "center_line_file",
+        "sha256",
+        "cone_counts",
+        "bounding_box",
+        "center_line_length",
+        "closed",
+    ],
+)
+TrackMetadata.__doc__ = """
+Metadata of a track stored in the manifest:
+    name: name of the track
+    cone_file: path of the cone file
+    center_line_file: path of the center line file
+    sha256: hash of the content of the cone file followed by the center line file
+    cone_counts: number of cones of each type in CONE_TYPES
+    bounding_box: [x_min, x_max, y_min, y_max] of the cones and center line
+    center_line_length: length of the center line (including the segment between the
+        last and first points for closed tracks)
+    closed: whether the center line is a closed loop
+"""
+
+
+def _track_entry(data_dir: str, name: str) -> dict:
+    files = {
+        "cones": f"{name}/{name}_cones.csv",
+        "center_line": f"{name}/{name}_center_line.csv",
+    }
+    sha256 = hashlib.sha256()
+    for file in files.values():
+        with open(os.path.join(data_dir, file), "rb") as f:
+            sha256.update(f.read())
+
+    cones = load_cone_table(os.path.join(data_dir, files["cones"]))
+    center_line, _ = load_center_line(os.path.join(data_dir, files["center_line"]))
+    points = np.vstack((cones["xy"], center_line))
+    closed = is_closed(center_line)
+    return {
+        "files": files,
+        "sha256": sha256.hexdigest(),
+        "cone_counts": {
+            cone_type: int(np.count_nonzero(cones["color"] == code))
+            for code, cone_type in enumerate(CONE_TYPES)
+        },
+        "bounding_box": [
+            float(points[:, 0].min()),
+            float(points[:, 0].max()),
+            float(points[:, 1].min()),
+            float(points[:, 1].max()),
+        ],
+        "center_line_length": float(polyline_length(center_line, closed)),
+        "closed": closed,
+    }
+
+
+def build_manifest(data_dir: str = DATA_DIR, names: Optional[list[str]] = None) -> dict:
+    """
+    Computes the manifest of the tracks stored in data_dir, i.e. the metadata of
+    each track folder containing a <name>_cones.csv and a <name>_center_line.csv file.
+    The tracks are listed in the order given by names if specified, otherwise in the
+    order of the current manifest followed by the new tracks in alphabetical order.
+    """
+    if names is None:
+        found = sorted(
+            name
+            for name in os.listdir(data_dir)
+            if os.path.isfile(os.path.join(data_dir, name, name + "_cones.csv"))
+            and os.path.isfile(os.path.join(data_dir, name, name + "_center_line.csv"))
+        )
+        try:
+            with open(os.path.join(data_dir, "manifest.json")) as f:
+                previous = list(json.load(f)["tracks"])
+        except FileNotFoundError:
+            previous = []
+        names = [name for name in previous if name in found]
+        names += [name for name in found if name not in names]
+
+    return {
+        "version": MANIFEST_VERSION,
+        "tracks": {name: _track_entry(data_dir, name) for name in names},
+    }
+
+
+def write_manifest(manifest: dict, filename: str = MANIFEST_FILE):
+    with open(filename, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+
+@lru_cache(maxsize=1)
+def load_manifest() -> dict:
+    """
+    Loads the manifest of the tracks in track_database/data (see build_manifest()).
+    """
+    with open(MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    if manifest["version"] != MANIFEST_VERSION:
+        raise ValueError(
+            f"Unsupported manifest version {manifest['version']}, regenerate it with generate/generate_manifest.py"
+        )
+    return manifest
+
+
+def track_metadata(name: str) -> TrackMetadata:
+    """
+    Returns the metadata of an available track without opening its files.
+    """
+    try:
+        entry = load_manifest()["tracks"][name]
+    except KeyError:
+        raise ValueError(f"Track {name} not available")
+    return TrackMetadata(
+        name=name,
+        cone_file=os.path.join(DATA_DIR, entry["files"]["cones"]),
+        center_line_file=os.path.join(DATA_DIR, entry["files"]["center_line"]),
+        sha256=entry["sha256"],
+        cone_counts=entry["cone_counts"],
+        bounding_box=entry["bounding_box"],
+        center_line_length=entry["center_line_length"],
+        closed=entry["closed"],
+    )
+
+
+def find_tracks(
+    closed: Optional[bool] = None,
+    min_length: Optional[float] = None,
+    max_length: Optional[float] = None,
+    predicate: Optional[Callable[[TrackMetadata], bool]] = None,
+) -> list[str]:
+    """
+    Returns the names of the available tracks matching all the given criteria, e.g.
+    find_tracks(closed=True, min_length=200.0) for all the closed tracks longer than
+    200 m. Arbitrary queries can be expressed with a predicate on the TrackMetadata.
+    Only the manifest is read, not the track files.
+    """
+    names = []
+    for name in load_manifest()["tracks"]:
+        metadata = track_metadata(name)
+        if closed is not None and metadata.closed != closed:
+            continue
+        if min_length is not None and metadata.center_line_length < min_length:
+            continue
+        if max_length is not None and metadata.center_line_length > max_length:
+            continue
+        if predicate is not None and not predicate(metadata):
+            continue
+        names.append(name)
+    return names
@@ -0,0 +1,203 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import os
+import tempfile
+import weakref
+from collections import namedtuple
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+try:
+    from .tracks import *
+    from .utils import *
+except ImportError:
+    from tracks import *
+    from utils import *
+
+__all__ = ["SharedTrackStore"]
+
+# offsets of the arrays in the shared file are multiples of this value
+_ALIGNMENT = 64
+
+SharedTrackStoreHandle = namedtuple(
+    "SharedTrackStoreHandle", ["path", "size", "layout"]
+)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _default_directory() -> Optional[str]:
+    # /dev/shm is backed by RAM on Linux, elsewhere the page cache of a temporary file
+    # is shared between the processes mapping it
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def _remove_file(path: str, pid: int):
+    # forked workers inherit the store of their parent, only the process that created
+    # the file is allowed to remove it
+    if os.getpid() == pid:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class SharedTrackStore:
+    """
+    Store of tracks shared between processes. The cone tables and center lines of the
+    tracks are loaded once by the process creating the store and written to a single
+    memory-mapped file, that the other processes map read-only. The tracks returned
+    by load_track() are zero-copy views of this file (with the same closedness as the
+    stored tracks), so the memory usage does not grow with the number of workers and
+    the workers never parse track files.
+
+    A store can be passed to worker processes directly (e.g. as an argument or in the
+    initargs of a multiprocessing.Pool): it is pickled as a small handle and attached
+    on the other side. The file is removed when the creating process closes the store
+    (or exits the with block, or garbage collects it).
+
+    Example:
+        with SharedTrackStore(available_tracks) as store:
+            with Pool(32, initializer=init_worker, initargs=(store,)) as pool:
+                ...
+        # in init_worker(store): track = store.load_track("track_5")
+    """
+
+    def __init__(
+        self,
+        tracks: Iterable[Union[str, Track]],
+        directory: Optional[str] = None,
+    ):
+        """
+        Args:
+            tracks: names of the tracks (see load_track()) or Track instances to share.
+            directory: directory of the shared file, by default /dev/shm if it exists
+                and the system temporary directory otherwise.
+        """
+        tracks = [
+            track if isinstance(track, Track) else load_track(track) for track in tracks
+        ]
+        layout = {}
+        size = 0
+        for track in tracks:
+            if track.name in layout:
+                raise ValueError(f"Track {track.name} given twice")
+            cones_offset = size
+            size = _align(size + track.cones.nbytes)
+            center_line_offset = size
+            size = _align(size + track.center_line.shape[0] * 4 * 8)
+            layout[track.name] = (
+                cones_offset,
+                track.cones.shape[0],
+                center_line_offset,
+                track.center_line.shape[0],
+                track.is_closed,
+            )
+        size = max(size, 1)
+
+        fd, path = tempfile.mkstemp(
+            prefix="track_database_",
+            suffix=".bin",
+            dir=directory if directory is not None else _default_directory(),
+        )
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, _remove_file, path, os.getpid())
+
+        buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+        self._handle = SharedTrackStoreHandle(path, size, layout)
+        for track in tracks:
+            cones, center_line = self._views(buffer, track.name)
+            cones[:] = track.cones
+            center_line[:, :2] = track.center_line
+            center_line[:, 2:] = track.track_widths
+        buffer.flush()
+        del buffer
+
+        self._attach()
+
+    @classmethod
+    def attach(cls, handle: SharedTrackStoreHandle) -> "SharedTrackStore":
+        """
+        Attaches to the store described by handle (see SharedTrackStore.handle) created
+        by another process.
+        """
+        store = cls.__new__(cls)
+        store._handle = handle
+        store._finalizer = None
+        store._attach()
+        return store
+
+    def _attach(self):
+        self._buffer = np.memmap(
+            self._handle.path, dtype=np.uint8, mode="r", shape=(self._handle.size,)
+        )
+        self._tracks = {}
+
+    def _views(self, buffer: np.ndarray, name: str) -> tuple[np.ndarray, np.ndarray]:
+        layout = self._handle.layout[name]
+        cones_offset, n_cones, center_line_offset, n_points = layout[:4]
+        cones = np.ndarray(
+            (n_cones,), dtype=CONE_DTYPE, buffer=buffer, offset=cones_offset
+        )
+        center_line = np.ndarray(
+            (n_points, 4), dtype=np.float64, buffer=buffer, offset=center_line_offset
+        )
+        return cones, center_line
+
+    @property
+    def handle(self) -> SharedTrackStoreHandle:
+        """Picklable description of the store, see SharedTrackStore.attach()."""
+        return self._handle
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._handle.layout)
+
+    def __len__(self) -> int:
+        return len(self._handle.layout)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._handle.layout
+
+    def load_track(self, name: str) -> Track:
+        """
+        Returns the track called name, whose arrays are read-only views of the shared
+        file. The same Track instance is returned by successive calls.
+        """
+        track = self._tracks.get(name)
+        if track is None:
+            if name not in self._handle.layout:
+                raise ValueError(
+                    f"Track {name} not in the store. Available tracks are: {self.names}"
+                )
+            cones, center_line = self._views(self._buffer, name)
+            track = Track.from_arrays(
+                name,
+                cones,
+                center_line[:, :2],
+                center_line[:, 2:],
+                closed=self._handle.layout[name][-1],
+            )
+            self._tracks[name] = track
+        return track
+
+    def close(self):
+        """
+        Unmaps the shared file, and removes it if the store was created by this
+        process. The tracks returned by load_track() must not be used afterwards.
+        """
+        self._tracks = {}
+        self._buffer = None
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __enter__(self) -> "SharedTrackStore":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __reduce__(self):
+        return SharedTrackStore.attach, (self._handle,)
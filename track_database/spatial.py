@@ -0,0 +1,267 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+from collections import namedtuple
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+try:
+    from .utils import *
+except ImportError:
+    from utils import *
+
+__all__ = [
+    "ConeIndex",
+    "NearestCones",
+    "ConesInRadius",
+    "VisibleCones",
+    "TrajectoryCollisions",
+]
+
+NearestCones = namedtuple("NearestCones", ["distances", "indices"])
+NearestCones.__doc__ = """
+k nearest cones of each query point, sorted by increasing distance:
+    distances: (N, k) array of distances (inf if there are less than k cones)
+    indices: (N, k) array of indices in the cone table of the track (-1 if there are
+        less than k cones)
+"""
+
+ConesInRadius = namedtuple("ConesInRadius", ["offsets", "indices", "distances"])
+ConesInRadius.__doc__ = """
+Cones within a radius of each query point, in compressed sparse row layout: the cones
+of query point i are indices[offsets[i]:offsets[i + 1]], sorted by increasing distance.
+    offsets: (N + 1,) array of offsets in indices and distances
+    indices: array of indices in the cone table of the track
+    distances: array of distances between the query points and the cones
+"""
+
+VisibleCones = namedtuple("VisibleCones", ["offsets", "indices", "xy", "colors"])
+VisibleCones.__doc__ = """
+Cones visible from each pose, in compressed sparse row layout: the cones visible from
+pose i are the rows offsets[i]:offsets[i + 1] of the other arrays, sorted by
+increasing distance.
+    offsets: (N + 1,) array of offsets in the other arrays
+    indices: array of indices in the cone table of the track
+    xy: (M, 2) array of positions of the cones in the frame of the vehicle (x axis
+        pointing forward, y axis pointing left)
+    colors: array of color codes of the cones (indices in CONE_TYPES)
+"""
+
+TrajectoryCollisions = namedtuple(
+    "TrajectoryCollisions", ["offsets", "indices", "times", "first_hit"]
+)
+TrajectoryCollisions.__doc__ = """
+Cones hit by the footprint of the vehicle along each trajectory, in compressed sparse
+row layout: the cones hit along trajectory b are indices[offsets[b]:offsets[b + 1]],
+each listed once and sorted by the time step at which it is first hit.
+    offsets: (B + 1,) array of offsets in indices and times
+    indices: array of indices in the cone table of the track
+    times: array of the first time steps at which the cones are hit
+    first_hit: (B,) array of the first time step with a collision along each
+        trajectory (-1 if there is none)
+"""
+
+Colors = Optional[Union[str, int, Iterable[Union[str, int]]]]
+
+
+def _color_codes(colors: Colors) -> Optional[tuple[int, ...]]:
+    """Normalizes cone types (names in CONE_TYPES or codes) to a sorted tuple."""
+    if colors is None:
+        return None
+    if isinstance(colors, (str, int, np.integer)):
+        colors = (colors,)
+    return tuple(
+        sorted(
+            {
+                CONE_TYPES.index(color) if isinstance(color, str) else int(color)
+                for color in colors
+            }
+        )
+    )
+
+
+class ConeIndex:
+    """
+    Spatial index over the cones of a track, answering batched nearest neighbour and
+    radius queries, optionally restricted to some cone types. One KD-tree is built
+    per requested combination of cone types, on first use, and reused afterwards.
+    """
+
+    def __init__(self, cones: np.ndarray):
+        """
+        Args:
+            cones: cone table of dtype CONE_DTYPE (see Track.cones).
+        """
+        self._xy = np.ascontiguousarray(cones["xy"])
+        self._color = np.asarray(cones["color"])
+        self._trees = {}
+
+    def tree(self, colors: Colors = None):
+        """
+        Returns the KD-tree (scipy.spatial.cKDTree) over the cones of the given types
+        (all cones by default) and the indices of these cones in the cone table.
+        """
+        codes = _color_codes(colors)
+        entry = self._trees.get(codes)
+        if entry is None:
+            # imported here to keep scipy out of `import track_database`
+            from scipy.spatial import cKDTree
+
+            if codes is None:
+                indices = np.arange(self._xy.shape[0])
+            else:
+                indices = np.flatnonzero(np.isin(self._color, codes))
+            entry = self._trees[codes] = (cKDTree(self._xy[indices]), indices)
+        return entry
+
+    def query_nearest(
+        self, points: np.ndarray, k: int = 1, colors: Colors = None
+    ) -> NearestCones:
+        """
+        Finds the k nearest cones (of the given types) of each point of an (N, 2)
+        array.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        tree, indices = self.tree(colors)
+        distances = np.full((points.shape[0], k), np.inf)
+        cone_indices = np.full((points.shape[0], k), -1, dtype=np.intp)
+        if indices.shape[0] > 0:
+            d, i = tree.query(points, k=k)
+            d, i = d.reshape(points.shape[0], k), i.reshape(points.shape[0], k)
+            found = i < indices.shape[0]
+            distances[found] = d[found]
+            cone_indices[found] = indices[i[found]]
+        return NearestCones(distances, cone_indices)
+
+    def query_radius(
+        self, points: np.ndarray, radius: float, colors: Colors = None
+    ) -> ConesInRadius:
+        """
+        Finds the cones (of the given types) within radius of each point of an (N, 2)
+        array.
+        """
+        # imported here to keep scipy out of `import track_database`
+        from scipy.spatial import cKDTree
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        tree, indices = self.tree(colors)
+        pairs = cKDTree(points).sparse_distance_matrix(
+            tree, radius, output_type="ndarray"
+        )
+        # sort by query point, then by distance
+        order = np.lexsort((pairs["v"], pairs["i"]))
+        pairs = pairs[order]
+        offsets = np.zeros(points.shape[0] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(pairs["i"], minlength=points.shape[0]), out=offsets[1:])
+        return ConesInRadius(offsets, indices[pairs["j"]], pairs["v"].copy())
+
+    def visible_cones(
+        self,
+        poses: np.ndarray,
+        max_range: float,
+        fov: float = 2 * np.pi,
+        colors: Colors = None,
+    ) -> VisibleCones:
+        """
+        Finds the cones (of the given types) inside the field of view of a sensor
+        placed at each pose of an (N, 3) array of (x, y, yaw), i.e. at most max_range
+        away and at most fov / 2 away from the heading of the pose.
+        The candidates are found with a radius query, so the cost scales with the
+        number of cones in range rather than with the total number of cones.
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 3)
+        in_range = self.query_radius(poses[:, :2], max_range, colors)
+        pose_idx = np.repeat(np.arange(poses.shape[0]), np.diff(in_range.offsets))
+
+        # transform the cones in the frames of the poses
+        delta = self._xy[in_range.indices] - poses[pose_idx, :2]
+        cos_yaw = np.cos(poses[pose_idx, 2])
+        sin_yaw = np.sin(poses[pose_idx, 2])
+        xy = np.column_stack(
+            (
+                cos_yaw * delta[:, 0] + sin_yaw * delta[:, 1],
+                -sin_yaw * delta[:, 0] + cos_yaw * delta[:, 1],
+            )
+        )
+
+        visible = np.abs(np.arctan2(xy[:, 1], xy[:, 0])) <= fov / 2
+        offsets = np.zeros(poses.shape[0] + 1, dtype=np.intp)
+        np.cumsum(
+            np.bincount(pose_idx[visible], minlength=poses.shape[0]), out=offsets[1:]
+        )
+        indices = in_range.indices[visible]
+        return VisibleCones(offsets, indices, xy[visible], self._color[indices])
+
+    def trajectory_collisions(
+        self,
+        trajectories: np.ndarray,
+        length: float,
+        width: float,
+        cone_radius: float = 0.15,
+        center_offset: float = 0.0,
+        colors: Colors = None,
+    ) -> TrajectoryCollisions:
+        """
+        Finds the cones (of the given types) hit by the footprint of a vehicle along a
+        batch of trajectories, i.e. an (B, T, 3) array of poses (x, y, yaw). The
+        footprint is a length x width rectangle aligned with the yaw, whose center is
+        center_offset ahead of the pose (e.g. half the wheelbase for poses of the rear
+        axle), and the cones are discs of radius cone_radius.
+        The candidates of each pose are the cones within the circumscribed circle of
+        the footprint, found with a radius query, and only these are tested exactly.
+        """
+        trajectories = np.asarray(trajectories, dtype=np.float64)
+        n_trajectories, n_steps = trajectories.shape[:2]
+        poses = trajectories.reshape(-1, 3)
+        cos_yaw = np.cos(poses[:, 2])
+        sin_yaw = np.sin(poses[:, 2])
+        centers = poses[:, :2] + center_offset * np.column_stack((cos_yaw, sin_yaw))
+        half_length = 0.5 * length
+        half_width = 0.5 * width
+        candidates = self.query_radius(
+            centers, np.hypot(half_length, half_width) + cone_radius, colors
+        )
+        pose_idx = np.repeat(np.arange(poses.shape[0]), np.diff(candidates.offsets))
+
+        # distance between the cones and the rectangles, in the frames of the vehicle
+        delta = self._xy[candidates.indices] - centers[pose_idx]
+        cos_yaw, sin_yaw = cos_yaw[pose_idx], sin_yaw[pose_idx]
+        x = np.abs(cos_yaw * delta[:, 0] + sin_yaw * delta[:, 1]) - half_length
+        y = np.abs(-sin_yaw * delta[:, 0] + cos_yaw * delta[:, 1]) - half_width
+        np.maximum(x, 0.0, out=x)
+        np.maximum(y, 0.0, out=y)
+        hit = x * x + y * y <= cone_radius**2
+
+        trajectory_idx, times = np.divmod(pose_idx[hit], n_steps)
+        indices = candidates.indices[hit]
+        # keep the first hit of each cone along each trajectory, then sort the cones
+        # of each trajectory by time
+        order = np.lexsort((times, indices, trajectory_idx))
+        trajectory_idx, times, indices = (
+            trajectory_idx[order],
+            times[order],
+            indices[order],
+        )
+        first = np.ones(order.shape[0], dtype=bool)
+        first[1:] = (trajectory_idx[1:] != trajectory_idx[:-1]) | (
+            indices[1:] != indices[:-1]
+        )
+        trajectory_idx, times, indices = (
+            trajectory_idx[first],
+            times[first],
+            indices[first],
+        )
+        order = np.lexsort((indices, times, trajectory_idx))
+        trajectory_idx, times, indices = (
+            trajectory_idx[order],
+            times[order],
+            indices[order],
+        )
+
+        offsets = np.zeros(n_trajectories + 1, dtype=np.intp)
+        np.cumsum(
+            np.bincount(trajectory_idx, minlength=n_trajectories), out=offsets[1:]
+        )
+        first_hit = np.full(n_trajectories, -1, dtype=np.intp)
+        collided = offsets[1:] > offsets[:-1]
+        first_hit[collided] = times[offsets[:-1][collided]]
+        return TrajectoryCollisions(offsets, indices, times, first_hit)
@@ -0,0 +1,127 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import numpy as np
+
+__all__ = ["CenterLineSpline"]
+
+
+class CenterLineSpline:
+    """
+    Cubic spline model of a center line and of its track widths, parameterized by the
+    arc length s of the polyline through the center line points (periodic if the
+    center line is closed). The spline is stored as piecewise polynomial coefficients
+    (same layout as scipy.interpolate.PPoly) of the 4 channels x, y, right width and
+    left width, and is evaluated without scipy.
+
+    The piece containing each query is found in O(1) with a uniform grid over s: each
+    bucket of the grid stores its first piece, from which at most a few (fixed at
+    construction) knots have to be skipped.
+    """
+
+    def __init__(self, center_line: np.ndarray, track_widths: np.ndarray, closed: bool):
+        """
+        Args:
+            center_line: (N, 2) array of center line points.
+            track_widths: (N, 2) array of (right, left) track widths.
+            closed: whether the center line is a closed loop.
+        """
+        # imported here to keep scipy out of `import track_database`
+        from scipy.interpolate import CubicSpline
+
+        values = np.column_stack((center_line, track_widths)).astype(np.float64)
+        if closed:
+            values = np.concatenate((values, values[:1]))
+        segment_lengths = np.hypot(*np.diff(values[:, :2], axis=0).T)
+        # the knots must be strictly increasing, so repeated points are dropped
+        keep = np.concatenate(([True], segment_lengths > 0.0))
+        if closed and not keep[-1]:
+            # the last point is a copy of the first one
+            keep[-2:] = False, True
+        knots = np.concatenate(([0.0], np.cumsum(segment_lengths)))[keep]
+        values = values[keep]
+        min_points = 3 if closed else 2
+        if knots.shape[0] - closed < min_points:
+            raise ValueError(
+                f"A center line spline needs at least {min_points} distinct points"
+            )
+
+        spline = CubicSpline(
+            knots, values, bc_type="periodic" if closed else "not-a-knot"
+        )
+        self.closed = closed
+        self.knots = knots
+        self.length = float(knots[-1])
+        # (4, K, 4) array of the coefficients of the K pieces, from the highest
+        # degree, for each channel
+        self.coefficients = spline.c
+        # coefficients of the derivatives of each order
+        self._derivatives = [self.coefficients]
+        for _ in range(3):
+            c = self._derivatives[-1]
+            degree = c.shape[0] - 1
+            self._derivatives.append(c[:-1] * np.arange(degree, 0, -1)[:, None, None])
+
+        # uniform bucket grid for the piece lookup
+        n_pieces = knots.shape[0] - 1
+        self._upper = np.append(knots[1:-1], np.inf)
+        self._inv_bucket_size = n_pieces / self.length
+        bucket_start = np.arange(n_pieces + 1) / self._inv_bucket_size
+        first = np.searchsorted(knots, bucket_start, side="right") - 1
+        # start one piece earlier to be robust to rounding errors in the bucket index
+        self._bucket_piece = np.clip(first[:-1] - 1, 0, n_pieces - 1)
+        self._n_steps = int(
+            np.max(np.clip(first[1:], 0, n_pieces - 1) - self._bucket_piece)
+        )
+
+    def piece(self, s: np.ndarray) -> np.ndarray:
+        """
+        Returns the index of the piece containing each arc length of s (which must
+        already lie in [0, length) on closed center lines).
+        """
+        bucket = (s * self._inv_bucket_size).astype(np.intp)
+        np.clip(bucket, 0, self._bucket_piece.shape[0] - 1, out=bucket)
+        piece = self._bucket_piece[bucket]
+        for _ in range(self._n_steps):
+            piece += s >= self._upper[piece]
+        return piece
+
+    def eval(self, s: np.ndarray, derivative: int = 0) -> np.ndarray:
+        """
+        Evaluates the spline (or its derivative of the given order with respect to s)
+        at the arc lengths of s. On closed center lines s is taken modulo the length,
+        on open ones the end pieces are extrapolated.
+        Returns an array of shape s.shape + (4,) of (x, y, right width, left width).
+        """
+        if not 0 <= derivative <= 3:
+            raise ValueError(f"derivative must be between 0 and 3, got {derivative}")
+        s = np.asarray(s, dtype=np.float64)
+        if self.closed:
+            s = np.mod(s, self.length)
+        piece = self.piece(s)
+        ds = (s - self.knots[piece])[..., None]
+        c = self._derivatives[derivative]
+        # Horner scheme
+        result = c[0, piece].copy()
+        for i in range(1, c.shape[0]):
+            result *= ds
+            result += c[i, piece]
+        return result
+
+    def position(self, s: np.ndarray) -> np.ndarray:
+        """Returns the (..., 2) positions of the center line at the arc lengths s."""
+        return self.eval(s)[..., :2]
+
+    def widths(self, s: np.ndarray) -> np.ndarray:
+        """Returns the (..., 2) (right, left) track widths at the arc lengths s."""
+        return self.eval(s)[..., 2:]
+
+    def heading(self, s: np.ndarray) -> np.ndarray:
+        """Returns the headings of the center line at the arc lengths s."""
+        d = self.eval(s, 1)
+        return np.arctan2(d[..., 1], d[..., 0])
+
+    def curvature(self, s: np.ndarray) -> np.ndarray:
+        """Returns the signed curvatures of the center line at the arc lengths s."""
+        d1 = self.eval(s, 1)
+        d2 = self.eval(s, 2)
+        speed = np.hypot(d1[..., 0], d1[..., 1])
+        return (d1[..., 0] * d2[..., 1] - d1[..., 1] * d2[..., 0]) / speed**3
@@ -1,12 +1,43 @@
 from argparse import ArgumentParser
 import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy import signal, spatial, interpolate
-from shapely.geometry.polygon import Point, LineString, Polygon
-from utils import save_cones, save_center_line, plot_cones
+from shapely.geometry.polygon import Polygon
 from enum import Enum
 
+try:
+    from .geometry import sample_polyline
+    from .tracks import Track
+    from .utils import make_cone_table, save_cones, save_center_line, plot_cones
+except ImportError:
+    from geometry import sample_polyline
+    from tracks import Track
+    from utils import make_cone_table, save_cones, save_center_line, plot_cones
+
+
+BatchGeneration = namedtuple(
+    "BatchGeneration", ["tracks", "failures", "refits", "elapsed", "throughput"]
+)
+BatchGeneration.__doc__ = """
+Result of TrackGenerator.create_tracks():
+    tracks: list of the generated tracks (see TrackGenerator.generate_track()) in
+        seed order, the i-th one being called random_<i> (None for the failures)
+    failures: dict mapping the indices of the tracks that could not be generated to
+        their TrackGenerationError
+    refits: list of the number of spline fits needed to bring the curvature of each
+        track within limits (None for the failures)
+    elapsed: wall time of the generation in seconds
+    throughput: number of tracks generated per second
+"""
+
+
+class TrackGenerationError(Exception):
+    """Raised when TrackGenerator cannot create a valid track."""
+
 
 class Mode(Enum):
     """
@@ -47,6 +78,30 @@ def closest_node(node, nodes, k):
     return np.argpartition(distance, k)[k]
 
 
+def point_segment_distance(points, start, end):
+    """
+    Returns the distances between points and a segment.
+
+    Args:
+        points (numpy.ndarray): Nx2 array of points.
+        start (numpy.ndarray): First point of the segment.
+        end (numpy.ndarray): Last point of the segment.
+
+    Returns:
+        numpy.ndarray: Distances of the points to the segment.
+    """
+    direction = end - start
+    deltas = points - start
+    squared_length = direction @ direction
+    t = (
+        np.clip(deltas @ direction / squared_length, 0.0, 1.0)
+        if squared_length
+        else 0.0
+    )
+    deltas -= np.multiply.outer(t, direction)
+    return np.hypot(deltas[:, 0], deltas[:, 1])
+
+
 def clockwise_sort(p):
     """
     Sorts nodes in clockwise order.
@@ -117,6 +172,12 @@ def transformation_matrix(displacement, angle):
     return M
 
 
+def _default_rng() -> np.random.Generator:
+    # seeded from the legacy global state, so that seeding with np.random.seed() (the
+    # only way to reproduce a track before the rng arguments) still does
+    return np.random.default_rng(np.random.randint(2**32, dtype=np.uint64))
+
+
 class TrackGenerator:
     """
     Generates a random track based on a bounded Voronoi diagram.
@@ -140,6 +201,8 @@ class TrackGenerator:
         z_offset: float = 0.0,
         lat_offset: float = 0.0,
         lon_offset: float = 0.0,
+        max_refits: int = 50,
+        max_attempts: int = 100,
     ):
         # Input parameters
         self._n_points = n_points  # [-]
@@ -157,6 +220,8 @@ class TrackGenerator:
         self._length_start_area = 6.0  # [m]
         self._curvature_threshold = 1.0 / 3.75  # [m^-1]
         self._straight_threshold = 1.0 / 100.0  # [m^-1]
+        self._max_refits = max_refits  # [-]
+        self._max_attempts = max_attempts  # [-]
 
         # Output options
         self._z_offset = z_offset
@@ -205,7 +270,12 @@ class TrackGenerator:
         ]
         return vor
 
-    def create_track(self, plot_track: bool = True, plot_voronoi: bool = True):
+    def create_track(
+        self,
+        plot_track: bool = True,
+        plot_voronoi: bool = True,
+        rng: Optional[np.random.Generator] = None,
+    ):
         """
         Creates a track from the vertices of a Voronoi diagram.
         1.  Create bounded Voronoi diagram.
@@ -213,66 +283,150 @@ class TrackGenerator:
         3.  Get the vertices belonging to the regions and sort them clockwise.
         4.  Interpolate between vertices.
         5.  Calculate curvature of track to check wether the curvature threshold is exceeded.
-        6.  If curvature threshold is exceeded, remove vertice where the curvature is the highest from its set.
-            Repeat steps 4-6 until curvature is within limimts.
+        6.  If curvature threshold is exceeded, remove the vertices closest to all the curvature peaks above it.
+            Repeat steps 4-6 until curvature is within limimts (see prune_vertices()), or go to step 2 if it cannot be.
         7.  Check if track does not cross itself. If so, go to step 2 and reiterate.
+            After max_attempts selections of regions, a TrackGenerationError is raised.
         8.  Find long enough straight section to place start line and start position.
         9.  Translate and rotate track to origin.
         10. Create track yaml file.
+
+        All the random numbers are drawn from rng (by default a generator seeded from
+        the global numpy.random state), so that a seeded rng, or a call to
+        numpy.random.seed() before, always creates the same track.
+        The number of spline fits made in step 4 is stored in self.refits.
+        """
+        if rng is None:
+            rng = _default_rng()
+        (
+            self.blue_cones,
+            self.yellow_cones,
+            self.center_line,
+            plot_data,
+            self.refits,
+        ) = self._generate(rng)
+
+        # Create track file
+        if plot_voronoi:
+            self.plot_voronoi(*plot_data)
+        if plot_track:
+            self.plot_track()
+
+    def select_points(
+        self, input_points: np.ndarray, rng: np.random.Generator
+    ) -> np.ndarray:
+        """
+        Selects the points whose Voronoi regions form the track, according to the
+        selection mode (see Mode), with vectorized distance computations.
+
+        Args:
+            input_points (numpy.ndarray): Coordinates of input points for Voronoi diagram.
+            rng (numpy.random.Generator): Source of the random numbers.
+
+        Returns:
+            numpy.ndarray: Indices of the selected points.
+        """
+        if self._mode.value == 1:
+            # Pick a random point and find its n closest neighbours, sorted by distance
+            random_index = rng.integers(0, self._n_points)
+            deltas = input_points - input_points[random_index]
+            distances = np.einsum("ij,ij->i", deltas, deltas)
+            closest = np.argpartition(distances, self._n_regions - 1)[: self._n_regions]
+            return closest[np.argsort(distances[closest], kind="stable")]
+
+        elif self._mode.value == 2:
+            # Pick a random point, create a line extending from this point and find other points close to this line
+            random_index = rng.integers(0, self._n_points)
+            random_heading = rng.uniform(0, np.pi / 2)
+            random_point = input_points[random_index]
+            half_line = (
+                0.5
+                * self._max_bound
+                * np.array([np.cos(random_heading), np.sin(random_heading)])
+            )
+            distances = point_segment_distance(
+                input_points, random_point - half_line, random_point + half_line
+            )
+            return np.argpartition(distances, self._n_regions)[: self._n_regions]
+
+        elif self._mode.value == 3:
+            # Select regions randomly
+            return rng.integers(0, self._n_points, self._n_regions)
+
+    def _interpolate(self, sorted_vertices: np.ndarray) -> tuple:
+        """
+        Interpolates the closed sequence of vertices (the first vertex being repeated
+        at the end) with a periodic spline sampled at 200 points.
+
+        Returns:
+            tuple: x and y coordinates of the samples and absolute curvature at them.
+        """
+        tck, _ = interpolate.splprep(
+            [sorted_vertices[:, 0], sorted_vertices[:, 1]], s=0, per=True
+        )
+        t = np.linspace(0, 1, 200, endpoint=False)
+        x, y = interpolate.splev(t, tck, der=0)
+        dx_dt, dy_dt = interpolate.splev(t, tck, der=1)
+        d2x_dt2, d2y_dt2 = interpolate.splev(t, tck, der=2)
+        return x, y, np.abs(curvature(dx_dt, d2x_dt2, dy_dt, d2y_dt2))
+
+    def prune_vertices(self, sorted_vertices: np.ndarray) -> tuple:
+        """
+        Removes vertices until the curvature of the spline interpolating them is within
+        limits. Each pass fits the spline once and removes, for every curvature peak
+        above the threshold, the vertex closest to it.
+
+        Args:
+            sorted_vertices (numpy.ndarray): Vertices sorted clockwise, the first vertex being repeated at the end.
+
+        Returns:
+            tuple: Remaining vertices (None if the curvature could not be brought within limits in max_refits fits
+                or if less than 4 vertices would remain), samples of their spline (see _interpolate()) and number of
+                spline fits made.
+        """
+        refits = 0
+        while refits < self._max_refits:
+            # a periodic cubic spline needs at least 4 distinct vertices
+            if sorted_vertices.shape[0] - 1 < 4:
+                return None, None, refits
+            x, y, abs_curvature = self._interpolate(sorted_vertices)
+            refits += 1
+
+            peaks, _ = signal.find_peaks(abs_curvature)
+            exceeded_peaks = peaks[abs_curvature[peaks] > self._curvature_threshold]
+            if exceeded_peaks.size == 0:
+                return sorted_vertices, (x, y, abs_curvature), refits
+
+            # delete the vertices closest to the exceeded peaks, and repeat the first
+            # remaining vertex at the end for periodic interpolation
+            vertices = sorted_vertices[:-1]
+            deltas = (
+                np.column_stack((x[exceeded_peaks], y[exceeded_peaks]))[:, None, :]
+                - vertices
+            )
+            closest = np.argmin(np.einsum("ijk,ijk->ij", deltas, deltas), axis=1)
+            vertices = np.delete(vertices, np.unique(closest), axis=0)
+            sorted_vertices = np.vstack([vertices, vertices[:1]])
+        return None, None, refits
+
+    def _generate(self, rng: np.random.Generator) -> tuple:
+        """
+        Runs the steps of create_track() and returns the blue cones, yellow cones and
+        center line of the track, with the data needed by plot_voronoi().
         """
         # Create bounded Voronoi diagram
-        input_points = np.random.uniform(
+        input_points = rng.uniform(
             self._min_bound, self._max_bound, (self._n_points, 2)
         )
         vor = self.bounded_voronoi(input_points, self._bounding_box)
 
-        while True:
-            if self._mode.value == 1:
-                # Pick a random point and find its n closest neighbours
-                random_index = np.random.randint(0, self._n_points)
-                random_point_indices = [random_index]
-                random_point = input_points[random_index]
+        regions = np.array([np.array(region) for region in vor.regions], dtype=object)
 
-                for i in range(self._n_regions - 1):
-                    closest_point_index = closest_node(
-                        random_point, input_points, k=i + 1
-                    )
-                    random_point_indices.append(closest_point_index)
-
-            elif self._mode.value == 2:
-                # Pick a random point, create a line extending from this point and find other points close to this line
-                random_index = np.random.randint(0, self._n_points)
-                random_heading = np.random.uniform(0, np.pi / 2)
-                random_point = input_points[random_index]
-
-                start = (
-                    random_point[0]
-                    - 1.0 / 2.0 * self._max_bound * np.cos(random_heading),
-                    random_point[1]
-                    - 1.0 / 2.0 * self._max_bound * np.sin(random_heading),
-                )
-                end = (
-                    random_point[0]
-                    + 1.0 / 2.0 * self._max_bound * np.cos(random_heading),
-                    random_point[1]
-                    + 1.0 / 2.0 * self._max_bound * np.sin(random_heading),
-                )
-                line = LineString([start, end])
-                distances = [Point(p).distance(line) for p in input_points]
-                random_point_indices = np.argpartition(distances, self._n_regions)[
-                    : self._n_regions
-                ]
-
-            elif self._mode.value == 3:
-                # Select regions randomly
-                random_point_indices = np.random.randint(
-                    0, self._n_points, self._n_regions
-                )
+        refits = 0
+        for _ in range(self._max_attempts):
+            random_point_indices = self.select_points(input_points, rng)
 
             # From the Voronoi regions, get the regions belonging to the randomly selected points
-            regions = np.array(
-                [np.array(region) for region in vor.regions], dtype=object
-            )
             random_region_indices = vor.point_region[random_point_indices]
             random_regions = np.concatenate(regions[random_region_indices])
 
@@ -283,40 +437,12 @@ class TrackGenerator:
             sorted_vertices = clockwise_sort(random_vertices)
             sorted_vertices = np.vstack([sorted_vertices, sorted_vertices[0]])
 
-            while True:
-                # Interpolate
-                tck, _ = interpolate.splprep(
-                    [sorted_vertices[:, 0], sorted_vertices[:, 1]], s=0, per=True
-                )
-                t = np.linspace(0, 1, 200, endpoint=False)
-                x, y = interpolate.splev(t, tck, der=0)
-                dx_dt, dy_dt = interpolate.splev(t, tck, der=1)
-                d2x_dt2, d2y_dt2 = interpolate.splev(t, tck, der=2)
-
-                # Calculate curvature
-                k = curvature(dx_dt, d2x_dt2, dy_dt, d2y_dt2)
-                abs_curvature = np.abs(k)
-
-                # Check if curvature exceeds threshold
-                peaks, _ = signal.find_peaks(abs_curvature)
-                exceeded_peaks = abs_curvature[peaks] > self._curvature_threshold
-                max_peak_index = abs_curvature[peaks].argmax()
-                is_curvature_exceeded = exceeded_peaks[max_peak_index]
-
-                if is_curvature_exceeded:
-                    # Find vertice where curvature is exceeded and delete vertice from sorted vertices. Reiterate
-                    max_peak = peaks[max_peak_index]
-                    peak_coordinate = (x[max_peak], y[max_peak])
-                    vertice = closest_node(peak_coordinate, sorted_vertices, k=0)
-                    sorted_vertices = np.delete(sorted_vertices, vertice, axis=0)
-
-                    # Make sure that first and last coordinate are the same for periodic interpolation
-                    if not np.array_equal(sorted_vertices[0], sorted_vertices[-1]):
-                        sorted_vertices = np.vstack(
-                            [sorted_vertices, sorted_vertices[0]]
-                        )
-                else:
-                    break
+            sorted_vertices, samples, n_fits = self.prune_vertices(sorted_vertices)
+            refits += n_fits
+            if sorted_vertices is None:
+                # the curvature could not be brought within limits, select other regions
+                continue
+            x, y, abs_curvature = samples
 
             # Create track boundaries
             track = Polygon(zip(x, y))
@@ -332,31 +458,18 @@ class TrackGenerator:
                     == "Polygon"
                 ):
                     break
+        else:
+            raise TrackGenerationError(
+                f"Unable to create a valid track after {self._max_attempts} selections of "
+                "Voronoi regions. Try different input parameters."
+            )
 
-        # Calculate cone spacing
-        cone_spacing_left = np.linspace(
-            0,
-            track_left.length,
-            np.ceil(track_left.length / self._track_width).astype(int) + 1,
-        )[:-1]
-        cone_spacing_right = np.linspace(
-            0,
-            track_right.length,
-            np.ceil(track_right.length / self._track_width).astype(int) + 1,
-        )[:-1]
-
-        # Determine coordinates of cones
-        cones_left = np.asarray(
-            [
-                np.asarray(track_left.exterior.interpolate(sp).xy).flatten()
-                for sp in cone_spacing_left
-            ]
+        # Place the cones along the boundaries, at most one track width apart
+        cones_left = sample_polyline(
+            np.asarray(track_left.exterior.coords)[:-1], True, self._track_width
         )
-        cones_right = np.asarray(
-            [
-                np.asarray(track_right.exterior.interpolate(sp).xy).flatten()
-                for sp in cone_spacing_right
-            ]
+        cones_right = sample_polyline(
+            np.asarray(track_right.exterior.coords)[:-1], True, self._track_width
         )
 
         # Find straight section in track that is at least the length of the start area
@@ -385,7 +498,7 @@ class TrackGenerator:
         try:
             start_line_index = np.where(length_straights > length_start_area)[0][0]
         except IndexError:
-            raise Exception(
+            raise TrackGenerationError(
                 "Unable to find suitable starting position. Try to decrease the length of the starting area or different input parameters."
             )
         # find origin
@@ -397,9 +510,9 @@ class TrackGenerator:
         # Translate and rotate track to origin
         x = np.concatenate((x[origin_index:], x[:origin_index]))
         y = np.concatenate((y[origin_index:], y[:origin_index]))
-        self.blue_cones = cones_left - start_position
-        self.yellow_cones = cones_right - start_position
-        self.center_line = np.column_stack((x, y)) - start_position
+        blue_cones = cones_left - start_position
+        yellow_cones = cones_right - start_position
+        center_line = np.column_stack((x, y)) - start_position
         start_heading = np.arctan2(y[1] - y[0], x[1] - x[0])
         angle_offset = np.pi / 2 - start_heading
         rot = np.array(
@@ -408,17 +521,113 @@ class TrackGenerator:
                 [np.sin(angle_offset), np.cos(angle_offset)],
             ]
         )
-        self.blue_cones = self.blue_cones @ rot.T
-        self.yellow_cones = self.yellow_cones @ rot.T
-        self.center_line = self.center_line @ rot.T
+        blue_cones = blue_cones @ rot.T
+        yellow_cones = yellow_cones @ rot.T
+        center_line = center_line @ rot.T
+        plot_data = (vor, sorted_vertices, random_point_indices, input_points, x, y)
+        return blue_cones, yellow_cones, center_line, plot_data, refits
+
+    def generate_track(
+        self, rng: Optional[np.random.Generator] = None, name: str = "random_track"
+    ) -> Track:
+        """
+        Creates a track like create_track(), but without plotting nor storing the
+        result on the generator, and returns it as a Track: blue cones on the left,
+        yellow cones on the right, the big orange cones of the start area and a
+        constant track width. The number of spline fits is stored in self.refits.
+        """
+        if rng is None:
+            rng = _default_rng()
+        blue_cones, yellow_cones, center_line, _, self.refits = self._generate(rng)
+        return Track.from_arrays(
+            name,
+            make_cone_table(
+                blue_cones, yellow_cones, self.BIG_ORANGE_CONES, np.empty((0, 2))
+            ),
+            center_line,
+            np.full_like(center_line, self._track_width / 2),
+        )
 
-        # Create track file
-        if plot_voronoi:
-            self.plot_voronoi(
-                vor, sorted_vertices, random_point_indices, input_points, x, y
-            )
-        if plot_track:
-            self.plot_track()
+    def iter_tracks(
+        self, seed: Optional[int] = None, count: Optional[int] = None
+    ) -> Iterator[Track]:
+        """
+        Lazily creates tracks (see generate_track()), indefinitely or until count
+        attempts have been made. The i-th attempt creates a track called random_<i>
+        with the same random numbers as the i-th track of create_tracks(seed, ...).
+        The attempts raising a TrackGenerationError (see create_track()) are skipped,
+        so fewer than count tracks may be yielded. Any other exception is propagated.
+        """
+        seed_sequence = np.random.SeedSequence(seed)
+        i = 0
+        while count is None or i < count:
+            (child,) = seed_sequence.spawn(1)
+            try:
+                yield self.generate_track(np.random.default_rng(child), f"random_{i}")
+            except TrackGenerationError:
+                pass
+            i += 1
+
+    def create_tracks(
+        self, seed: int, count: int, workers: Optional[int] = None
+    ) -> BatchGeneration:
+        """
+        Creates count tracks in parallel over a process pool, without plotting.
+        Each track draws its random numbers from its own generator, seeded by the
+        i-th child of numpy.random.SeedSequence(seed), so that the tracks only depend
+        on seed and on their index, whatever the number of workers.
+
+        Args:
+            seed: base seed of the batch.
+            count: number of tracks to create.
+            workers: number of processes, by default the number of CPUs. With
+                workers=1 the tracks are created serially in the calling process.
+
+        Returns:
+            BatchGeneration: the tracks in seed order and the reached throughput. A
+            TrackGenerationError (see create_track()) does not abort the batch, it is
+            stored in BatchGeneration.failures. Any other exception is propagated.
+        """
+        seeds = np.random.SeedSequence(seed).spawn(count)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        start = time.perf_counter()
+        if workers <= 1 or count <= 1:
+            results = [
+                _create_track_or_exception(self, seed, i)
+                for i, seed in enumerate(seeds)
+            ]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, count)) as executor:
+                results = list(
+                    executor.map(
+                        _create_track_or_exception,
+                        [self] * count,
+                        seeds,
+                        range(count),
+                        chunksize=max(1, count // (4 * workers)),
+                    )
+                )
+        elapsed = time.perf_counter() - start
+
+        tracks = []
+        failures = {}
+        refits = []
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                failures[i] = result
+                tracks.append(None)
+                refits.append(None)
+            else:
+                tracks.append(result[0])
+                refits.append(result[1])
+        return BatchGeneration(
+            tracks,
+            failures,
+            refits,
+            elapsed,
+            (count - len(failures)) / max(elapsed, 1e-9),
+        )
 
     def plot_voronoi(
         self, vor, sorted_vertices, random_point_indices, input_points, x, y
@@ -432,6 +641,8 @@ class TrackGenerator:
             random_point_indices (numpy.ndarray): Selected points.
             input_points (numpy.ndarray): All Voronoi points.
         """
+        import matplotlib.pyplot as plt
+
         # Plot initial points
         plt.figure()
         plt.plot(vor.filtered_points[:, 0], vor.filtered_points[:, 1], "b.")
@@ -479,6 +690,8 @@ class TrackGenerator:
             cones_left (numpy.ndarray): Nx2 numpy array of left cone coordinates.
             cones_right (numpy.ndarray): Nx2 numpy array of right cone coordinates.
         """
+        import matplotlib.pyplot as plt
+
         plt.figure()
         plot_cones(
             self.blue_cones,
@@ -515,6 +728,16 @@ class TrackGenerator:
         )
 
 
+def _create_track_or_exception(
+    generator: TrackGenerator, seed: np.random.SeedSequence, i: int
+):
+    try:
+        track = generator.generate_track(np.random.default_rng(seed), f"random_{i}")
+        return track, generator.refits
+    except TrackGenerationError as e:
+        return e
+
+
 if __name__ == "__main__":
     parser = ArgumentParser("random_track_generator")
     parser.add_argument(
@@ -522,12 +745,33 @@ if __name__ == "__main__":
     )
     parser.add_argument("--track_name", required=True)
     parser.add_argument("--seed", required=False)
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=None,
+        help="create this many tracks in parallel (named <track_name>_<i>) without plotting",
+    )
+    parser.add_argument("--workers", type=int, default=None)
     args = parser.parse_args()
-    if args.seed is not None:
-        np.random.seed(int(args.seed))
+    seed = int(args.seed) if args.seed is not None else None
     generator = TrackGenerator(
         lat_offset=51.197682,
         lon_offset=5.323411,
     )
-    generator.create_track(plot_track=True, plot_voronoi=True)
-    generator.save_track(args.output_dir, args.track_name)
+    if args.count is None:
+        generator.create_track(
+            plot_track=True, plot_voronoi=True, rng=np.random.default_rng(seed)
+        )
+        generator.save_track(args.output_dir, args.track_name)
+    else:
+        batch = generator.create_tracks(seed, args.count, args.workers)
+        for i, track in enumerate(batch.tracks):
+            if track is not None:
+                generator.blue_cones = track.blue_cones
+                generator.yellow_cones = track.yellow_cones
+                generator.center_line = track.center_line
+                generator.save_track(args.output_dir, f"{args.track_name}_{i}")
+        print(
+            f"Created {args.count - len(batch.failures)} tracks in {batch.elapsed:.2f} s "
+            f"({batch.throughput:.1f} tracks/s), {len(batch.failures)} failures"
+        )
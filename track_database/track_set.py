@@ -0,0 +1,111 @@
+# Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Union
+
+try:
+    from .tracks import *
+    from .tracks import _is_compiled_track
+except ImportError:
+    from tracks import *
+    from tracks import _is_compiled_track
+
+__all__ = ["TrackSet", "load_tracks"]
+
+
+class TrackSet:
+    """
+    Ordered collection of tracks, that can be indexed by track name and iterated over
+    in the order in which the tracks were requested. The tracks that could not be
+    loaded are not part of the set but are listed with their exception in failures.
+    """
+
+    def __init__(
+        self,
+        tracks: Iterable[Track],
+        failures: Optional[dict[str, Exception]] = None,
+    ):
+        self._tracks = {track.name: track for track in tracks}
+        self.failures = {} if failures is None else failures
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._tracks)
+
+    def __getitem__(self, name: str) -> Track:
+        try:
+            return self._tracks[name]
+        except KeyError:
+            if name in self.failures:
+                raise KeyError(
+                    f"Track {name} could not be loaded: {self.failures[name]!r}"
+                )
+            raise
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tracks
+
+    def __iter__(self) -> Iterator[Track]:
+        return iter(self._tracks.values())
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __repr__(self) -> str:
+        return f"TrackSet({self.names}, failures={list(self.failures)})"
+
+
+def _load_track_or_exception(name: str, use_cache: bool) -> Union[Track, Exception]:
+    try:
+        return load_track(name, use_cache=use_cache)
+    except Exception as e:
+        return e
+
+
+def load_tracks(
+    names: Iterable[str],
+    workers: Optional[int] = None,
+    use_processes: Optional[bool] = None,
+    use_cache: bool = True,
+) -> TrackSet:
+    """
+    Loads several tracks concurrently (see load_track() for the accepted names).
+
+    Args:
+        names: names of the tracks (registered tracks or paths to track directories).
+        workers: number of threads or processes, by default the number of CPUs. With
+            workers=1 the tracks are loaded serially in the calling thread.
+        use_processes: whether to use a process pool instead of a thread pool. The
+            tracks are then pickled back to the calling process and do not share
+            the cache of the calling process. By default, a thread pool is only used
+            if all the tracks are read from their compiled files (see
+            compile_tracks()), since parsing the CSV files holds the GIL and does not
+            scale with the number of threads.
+        use_cache: see load_track().
+
+    Returns:
+        TrackSet: the loaded tracks in the order of names. A failure to load a track
+        does not abort the batch, the exception is stored in TrackSet.failures.
+    """
+    names = list(dict.fromkeys(names))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(names) <= 1:
+        results = [_load_track_or_exception(name, use_cache) for name in names]
+    else:
+        if use_processes is None:
+            use_processes = not all(_is_compiled_track(name) for name in names)
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=min(workers, len(names))) as executor:
+            results = list(
+                executor.map(_load_track_or_exception, names, [use_cache] * len(names))
+            )
+
+    tracks = []
+    failures = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            failures[name] = result
+        else:
+            tracks.append(result)
+    return TrackSet(tracks, failures)
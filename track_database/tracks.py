@@ -1,129 +1,726 @@
 # Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
 import os.path
-from os import listdir
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Optional
 
 import numpy as np
 
 try:
+    from .area import *
+    from .geometry import *
+    from .raster import *
+    from .registry import *
+    from .spatial import *
+    from .spline import *
     from .utils import *
 except ImportError:
+    from area import *
+    from geometry import *
+    from raster import *
+    from registry import *
+    from spatial import *
+    from spline import *
     from utils import *
 
-__all__ = ["available_tracks", "load_track", "Track"]
-
-available_tracks = [
-    "21_05_2023",
-    "acceleration",
-    "acceleration_4m",
-    "acceleration_4_5m",
-    "acceleration_5_5m",
-    "acceleration_large",
-    "ebs_test_fss",
-    "skidpad",
-    "skidpad_v2",
-    "skidpad_minimalist",
-    "skidpad_reversed",
-    "short_skidpad",
-    "fsds_competition_1",
-    "fsds_competition_2",
-    "fsds_competition_3",
-    "fsds_default",
-    "track_1",
-    "track_2",
-    "track_3",
-    "track_4",
-    "track_5",
-    "VSV",
-    "VSV_XS",
-    "VSV_XL",
-    "autoX_Vaudoise_Sponso",
+__all__ = [
+    "available_tracks",
+    "find_tracks",
+    "track_metadata",
+    "load_track",
+    "Track",
+    "clear_cache",
+    "cache_info",
+    "set_cache_size",
+    "compile_tracks",
 ]
 
+# the registry of the tracks stored in track_database/data is the manifest generated by
+# generate/generate_manifest.py
+available_tracks = list(load_manifest()["tracks"])
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+# Process-wide LRU cache of the arrays parsed from the track files. The keys contain
+# the resolved paths of the cone and center line files together with their
+# modification times and sizes, so that editing a file invalidates its entry.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_maxsize = 64
+_cache_hits = 0
+_cache_misses = 0
+
+
+def clear_cache():
+    """
+    Removes all the entries of the track cache and resets its statistics.
+    """
+    global _cache_hits, _cache_misses
+    with _cache_lock:
+        _cache.clear()
+        _cache_hits = 0
+        _cache_misses = 0
+
+
+def cache_info() -> CacheInfo:
+    """
+    Returns the hits, misses, maximum size and current size of the track cache (same
+    format as functools.lru_cache).
+    """
+    with _cache_lock:
+        return CacheInfo(_cache_hits, _cache_misses, _cache_maxsize, len(_cache))
+
+
+def set_cache_size(maxsize: int):
+    """
+    Sets the maximum number of tracks kept in the cache. The least recently used
+    entries are evicted if the cache is currently larger. A size of 0 disables the
+    cache for the whole process.
+    """
+    global _cache_maxsize
+    if maxsize < 0:
+        raise ValueError(f"maxsize must be non-negative, got {maxsize}")
+    with _cache_lock:
+        _cache_maxsize = maxsize
+        while len(_cache) > _cache_maxsize:
+            _cache.popitem(last=False)
+
+
+def _file_key(filename: str) -> tuple:
+    stat = os.stat(filename)
+    return os.path.realpath(filename), stat.st_mtime_ns, stat.st_size
+
+
+def _track_files(name: str) -> tuple[str, str]:
+    """
+    Returns the paths of the cone and center line files of a track, given either the
+    name of an available track or the path to a directory containing the files.
+    """
+    entry = load_manifest()["tracks"].get(name)
+    if entry is not None:
+        return (
+            os.path.join(DATA_DIR, entry["files"]["cones"]),
+            os.path.join(DATA_DIR, entry["files"]["center_line"]),
+        )
+
+    try:
+        files = os.listdir(name)
+    except (FileNotFoundError, NotADirectoryError):
+        files = []
+    cone_files = [file for file in files if file.endswith("cones.csv")]
+    center_line_files = [file for file in files if file.endswith("center_line.csv")]
+    if not cone_files or not center_line_files:
+        raise ValueError(
+            f"Track {name} not available, or could not find the required csv files. Available tracks are: {available_tracks}"
+        )
+    return os.path.join(name, cone_files[0]), os.path.join(name, center_line_files[0])
+
+
+# suffix of the compiled file containing the geometry of the center line
+_GEOMETRY_SUFFIX = "_geometry"
+
+# distance in meters by which the cones placed by Track.recone() are moved outwards
+# to test whether they are on the track, so that the ones on the boundary generated by
+# their own part of the center line are not
+_RECONE_MARGIN = 1e-6
+
+
+def _read_track_files(
+    cone_file: str, center_line_file: str, writeable: bool = False
+) -> tuple:
+    # prefer the compiled versions of the files (see compile_tracks()) if they are up
+    # to date, since they are memory-mapped instead of parsed
+    cone_table = load_compiled(cone_file, writeable)
+    if cone_table is None or cone_table.dtype != CONE_DTYPE:
+        cone_table = load_cone_table(cone_file)
+
+    center_line_arr = load_compiled(center_line_file, writeable)
+    if center_line_arr is None:
+        center_line, track_widths = load_center_line(center_line_file)
+    else:
+        center_line, track_widths = center_line_arr[:, :2], center_line_arr[:, 2:]
+
+    # the geometry derived from the center line is only available in compiled form,
+    # otherwise it is computed on demand by Track
+    geometry = load_compiled(center_line_file, writeable, suffix=_GEOMETRY_SUFFIX)
+    if geometry is not None and (
+        geometry.dtype != GEOMETRY_DTYPE or geometry.shape[0] != center_line.shape[0]
+    ):
+        geometry = None
+
+    return cone_table, center_line, track_widths, geometry
+
+
+def _is_compiled_track(name: str) -> bool:
+    """
+    Returns whether the track is read from its compiled files (memory-mapped) rather
+    than by parsing its CSV files, False if the track cannot be found.
+    """
+    try:
+        files = _track_files(name)
+    except ValueError:
+        return False
+    return all(is_compiled(file) for file in files)
+
+
+def _load_track_files(cone_file: str, center_line_file: str, use_cache: bool) -> tuple:
+    """
+    Returns the cone table, center line, track widths and center line geometry (None
+    if not compiled) stored in the given cone and center line files, either from the
+    cache or by parsing the files. Cached arrays are shared between all the Track
+    instances and are therefore read-only.
+    """
+    global _cache_hits, _cache_misses
+    if not use_cache or _cache_maxsize == 0:
+        return _read_track_files(cone_file, center_line_file, writeable=True)
+
+    key = (_file_key(cone_file), _file_key(center_line_file))
+    with _cache_lock:
+        arrays = _cache.get(key)
+        if arrays is not None:
+            _cache.move_to_end(key)
+            _cache_hits += 1
+            return arrays
+
+    arrays = _read_track_files(cone_file, center_line_file)
+    for arr in arrays:
+        if arr is not None:
+            arr.setflags(write=False)
+
+    with _cache_lock:
+        _cache_misses += 1
+        _cache[key] = arrays
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_maxsize:
+            _cache.popitem(last=False)
+
+    return arrays
+
 
 class Track:
     """
     Plain Old Data Structure (PODS) that represents a track. The track is defined by a
-    set of cones and a center line. The cones are stored in the following arrays:
+    set of cones and a center line. The cones are stored in a single structured array
+    of dtype CONE_DTYPE (one row per cone, in the order of the cone file):
+        cones: table of cones with fields xy, z, std, color (index in CONE_TYPES),
+            right and left
+    from which the following (N, 2) arrays of positions are derived on access:
         blue_cones: array of blue cones
         yellow_cones: array of yellow cones
         big_orange_cones: array of big orange cones
         small_orange_cones: array of small orange cones
         right_cones: array of right cones
         left_cones: array of left cones
+    They are views of cones["xy"] whenever the selected cones are contiguous in the
+    table (e.g. all the cones of one color), and copies made on each access otherwise
+    (e.g. the right and left cones).
     The center line is stored in the following array:
         center_line: array of points on the center line
         track_widths: array of track widths at each point on the center line
+
+    By default, the arrays are loaded through a process-wide cache (see cache_info()
+    and clear_cache()) and are shared between all the instances of the same track, so
+    they are read-only. Pass use_cache=False to get private, writeable arrays.
     """
 
     name: str
-    blue_cones: np.ndarray
-    yellow_cones: np.ndarray
-    big_orange_cones: np.ndarray
-    small_orange_cones: np.ndarray
-    right_cones: np.ndarray
-    left_cones: np.ndarray
+    cones: np.ndarray
     center_line: np.ndarray
     track_widths: np.ndarray
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, use_cache: bool = True):
         self.name = name
-        if name not in available_tracks:
-            try:
-                cone_file = os.path.join(
-                    name,
-                    list(
-                        filter(
-                            lambda file: file.endswith("cones.csv"), os.listdir(name)
-                        )
-                    )[0],
-                )
-                print("Cone file : ", cone_file)
-                center_line = os.path.join(
-                    name,
-                    list(
-                        filter(
-                            lambda file: file.endswith("center_line.csv"),
-                            os.listdir(name),
-                        )
-                    )[0],
-                )
-                print("center line file : ", center_line)
+        (
+            self.cones,
+            self.center_line,
+            self.track_widths,
+            geometry,
+        ) = _load_track_files(*_track_files(name), use_cache)
+        self._closed = None
+        self._cached = {}
+        if geometry is not None:
+            self._cached["geometry"] = geometry
+
+    @classmethod
+    def from_arrays(
+        cls,
+        name: str,
+        cones: np.ndarray,
+        center_line: np.ndarray,
+        track_widths: np.ndarray,
+        closed: Optional[bool] = None,
+    ) -> "Track":
+        """
+        Creates a track from an existing cone table (of dtype CONE_DTYPE), center line
+        and track widths, without copying them. closed tells whether the center line is
+        a closed loop, and is guessed from its points if None (see Track.is_closed).
+        """
+        if cones.dtype != CONE_DTYPE:
+            raise ValueError(f"cones must have dtype CONE_DTYPE, got {cones.dtype}")
+        track = cls.__new__(cls)
+        track.name = name
+        track.cones = cones
+        track.center_line = center_line
+        track.track_widths = track_widths
+        track._closed = None if closed is None else bool(closed)
+        track._cached = {}
+        return track
+
+    def __getstate__(self) -> dict:
+        # the lazily computed arrays are not pickled, they are recomputed on demand,
+        # but the closedness is kept since it cannot always be guessed again
+        state = self.__dict__.copy()
+        state["_cached"] = {}
+        return state
+
+    def _cone_array(self, key: str) -> np.ndarray:
+        """
+        Returns the positions of the cones of type key (one of CONE_TYPES) or on side
+        key ("right" or "left"). They are a view of the cone table, cached on first
+        access, if the selected cones are contiguous in the table, and a new copy on
+        each access otherwise, so that no cone is stored twice.
+        """
+        arr = self._cached.get(key)
+        if arr is None:
+            if key in CONE_TYPES:
+                mask = self.cones["color"] == CONE_TYPES.index(key)
+            else:
+                mask = self.cones[key]
+            idx = np.flatnonzero(mask)
+            xy = self.cones["xy"]
+            if idx.size > 0 and idx[-1] - idx[0] + 1 == idx.size:
+                arr = self._cached[key] = xy[idx[0] : idx[-1] + 1]
+            elif idx.size == 0:
+                arr = self._cached[key] = xy[:0]
+            else:
+                arr = xy[idx]
+                arr.setflags(write=self.cones.flags.writeable)
+        return arr
+
+    @property
+    def blue_cones(self) -> np.ndarray:
+        return self._cone_array("blue")
+
+    @property
+    def yellow_cones(self) -> np.ndarray:
+        return self._cone_array("yellow")
+
+    @property
+    def big_orange_cones(self) -> np.ndarray:
+        return self._cone_array("big_orange")
+
+    @property
+    def small_orange_cones(self) -> np.ndarray:
+        return self._cone_array("small_orange")
+
+    @property
+    def right_cones(self) -> np.ndarray:
+        return self._cone_array("right")
+
+    @property
+    def left_cones(self) -> np.ndarray:
+        return self._cone_array("left")
+
+    @property
+    def is_closed(self) -> bool:
+        """
+        Whether the center line is a closed loop, as given to Track.from_arrays() or
+        guessed from its points on first access (see utils.is_closed()).
+        """
+        if self._closed is None:
+            self._closed = is_closed(self.center_line)
+        return self._closed
+
+    @property
+    def geometry(self) -> np.ndarray:
+        """
+        Geometry of each point of the center line (array of dtype GEOMETRY_DTYPE, see
+        geometry.center_line_geometry()), loaded from the compiled track files or
+        computed on first access.
+        """
+        geometry = self._cached.get("geometry")
+        if geometry is None:
+            geometry = self._cached["geometry"] = center_line_geometry(
+                self.center_line, self.track_widths, self.is_closed
+            )
+        return geometry
+
+    @property
+    def arc_length(self) -> np.ndarray:
+        """Cumulative arc length of the center line points, starting at 0."""
+        return self.geometry["s"]
+
+    @property
+    def length(self) -> float:
+        """
+        Total length of the center line, including the segment from the last to the
+        first point on closed tracks.
+        """
+        segments = self.segments
+        return float(segments.s[-1] + segments.length[-1])
+
+    @property
+    def heading(self) -> np.ndarray:
+        """Heading of the center line at each of its points."""
+        return self.geometry["heading"]
+
+    @property
+    def curvature(self) -> np.ndarray:
+        """Curvature of the center line at each of its points."""
+        return self.geometry["curvature"]
+
+    @property
+    def left_boundary(self) -> np.ndarray:
+        """Points of the left track boundary, derived from the track widths."""
+        return self.geometry["left_boundary"]
+
+    @property
+    def right_boundary(self) -> np.ndarray:
+        """Points of the right track boundary, derived from the track widths."""
+        return self.geometry["right_boundary"]
+
+    @property
+    def segments(self) -> Segments:
+        """
+        Geometry of the segments of the center line (including the segment from the
+        last to the first point on closed tracks), computed on first access.
+        """
+        segments = self._cached.get("segments")
+        if segments is None:
+            segments = self._cached["segments"] = polyline_segments(
+                self.center_line, self.is_closed
+            )
+        return segments
+
+    @property
+    def spline(self) -> CenterLineSpline:
+        """
+        Cubic spline of the center line and track widths parameterized by arc length,
+        fitted on first access (see CenterLineSpline).
+        """
+        spline = self._cached.get("spline")
+        if spline is None:
+            spline = self._cached["spline"] = CenterLineSpline(
+                self.center_line, self.track_widths, self.is_closed
+            )
+        return spline
+
+    def _resampled(self, key: tuple, s: np.ndarray) -> "Track":
+        """
+        Returns the track with the same cones whose center line and track widths are
+        interpolated at the arc lengths s, cached under key.
+        """
+        track = self._cached.get(key)
+        if track is None:
+            values = interpolate_polyline(
+                self.center_line,
+                np.column_stack((self.center_line, self.track_widths)),
+                self.is_closed,
+                s,
+            )
+            # passed explicitly since a coarse resampling could fool the closedness
+            # heuristic
+            track = Track.from_arrays(
+                self.name, self.cones, values[:, :2], values[:, 2:], self.is_closed
+            )
+            self._cached[key] = track
+        return track
+
+    def resample(self, ds: float) -> "Track":
+        """
+        Returns a track with the same cones whose center line and track widths are
+        resampled with a uniform spacing in arc length, the closest to ds that divides
+        the length of the center line. The result is cached for each value of ds.
+        """
+        if ds <= 0.0:
+            raise ValueError(f"ds must be positive, got {ds}")
+        length = self.length
+        if self.is_closed:
+            n_points = max(3, round(length / ds))
+            s = np.arange(n_points) * (length / n_points)
+        else:
+            s = np.linspace(0.0, length, max(2, round(length / ds) + 1))
+        return self._resampled(("resample", ds), s)
+
+    def resample_by_curvature(
+        self, max_ds: float, max_angle: float = 0.1, min_ds: Optional[float] = None
+    ) -> "Track":
+        """
+        Returns a track with the same cones whose center line and track widths are
+        resampled with a spacing adapted to the curvature: the spacing is
+        max_angle / |curvature| (so that the heading changes by about max_angle
+        between two points), clipped to [min_ds, max_ds] (min_ds defaults to
+        max_ds / 10). The result is cached for each set of parameters.
+        """
+        if min_ds is None:
+            min_ds = max_ds / 10
+        if not 0.0 < min_ds <= max_ds:
+            raise ValueError(f"Expected 0 < min_ds <= max_ds, got {min_ds}, {max_ds}")
+        key = ("resample_by_curvature", max_ds, max_angle, min_ds)
+        if key in self._cached:
+            return self._cached[key]
+
+        # number of points per meter at the original points, integrated along the
+        # center line and inverted to place the new points
+        density = 1.0 / np.clip(
+            np.divide(
+                max_angle,
+                np.abs(self.curvature),
+                out=np.full(self.center_line.shape[0], np.inf),
+                where=self.curvature != 0.0,
+            ),
+            min_ds,
+            max_ds,
+        )
+        s = self.arc_length
+        if self.is_closed:
+            s = np.append(s, self.length)
+            density = np.append(density, density[0])
+        count = np.concatenate(
+            ([0.0], np.cumsum(0.5 * (density[1:] + density[:-1]) * np.diff(s)))
+        )
+        if self.is_closed:
+            n_points = max(3, int(np.ceil(count[-1])))
+            targets = np.arange(n_points) * (count[-1] / n_points)
+        else:
+            n_points = max(2, int(np.ceil(count[-1])) + 1)
+            targets = np.linspace(0.0, count[-1], n_points)
+        return self._resampled(key, np.interp(targets, count, s))
+
+    def decimate(self, tolerance: float) -> tuple["Track", Decimation]:
+        """
+        Returns a track with the same cones whose center line and track widths only
+        keep the points needed to stay within tolerance (in meters) of the original
+        ones (see geometry.decimate_polyline()), together with the indices of the kept
+        points, the achieved reduction and maximum error. The result is cached for
+        each tolerance.
+        """
+        key = ("decimate", tolerance)
+        result = self._cached.get(key)
+        if result is None:
+            decimation = decimate_polyline(
+                self.center_line, self.is_closed, tolerance, self.track_widths
+            )
+            track = Track.from_arrays(
+                self.name,
+                self.cones,
+                self.center_line[decimation.indices],
+                self.track_widths[decimation.indices],
+                self.is_closed,
+            )
+            result = self._cached[key] = (track, decimation)
+        return result
+
+    def recone(self, spacing: float) -> "Track":
+        """
+        Returns a track with the same center line and track widths, whose blue and
+        yellow cones are placed evenly along the left and right boundaries, at most
+        spacing apart (see geometry.sample_polyline()). The orange cones are kept.
+        Where the center line overlaps itself (e.g. on skidpad), the boundary of one
+        part runs through the track of another one, so the placed cones inside the
+        drivable area (see TrackArea) are dropped, as well as the ones within
+        spacing / 2 of an orange cone or of a previously placed cone.
+        The result is cached for each spacing.
+        """
+        key = ("recone", spacing)
+        track = self._cached.get(key)
+        if track is None:
+            # imported here to keep scipy out of `import track_database`
+            from scipy.spatial import cKDTree
+
+            closed = self.is_closed
+            normal = np.column_stack((-np.sin(self.heading), np.cos(self.heading)))
+            # positions and outward normals of the cones along each boundary
+            left = sample_polyline(
+                self.left_boundary,
+                closed,
+                spacing,
+                np.hstack((self.left_boundary, normal)),
+            )
+            right = sample_polyline(
+                self.right_boundary,
+                closed,
+                spacing,
+                np.hstack((self.right_boundary, -normal)),
+            )
+            placed = np.concatenate((left, right))
+            xy = placed[:, :2]
+            keep = ~self.contains(xy + _RECONE_MARGIN * placed[:, 2:])
+            orange = self.query_nearest(xy, colors=("big_orange", "small_orange"))
+            keep &= orange.distances[:, 0] > 0.5 * spacing
+            kept = np.flatnonzero(keep)
+            pairs = cKDTree(xy[kept]).query_pairs(0.5 * spacing, output_type="ndarray")
+            keep[kept[pairs[:, 1]]] = False
+
+            n_left = left.shape[0]
+            orange = self.cones["color"] >= CONE_TYPES.index("big_orange")
+            cones = np.concatenate(
                 (
-                    self.blue_cones,
-                    self.yellow_cones,
-                    self.big_orange_cones,
-                    self.small_orange_cones,
-                    self.right_cones,
-                    self.left_cones,
-                ) = load_cones(cone_file)
-                self.center_line, self.track_widths = load_center_line(center_line)
-            except IndexError:
-                raise ValueError(
-                    f"Track {name} not available, or could not find the required csv files. Available tracks are: {available_tracks}"
+                    make_cone_table(
+                        xy[:n_left][keep[:n_left]],
+                        xy[n_left:][keep[n_left:]],
+                        np.empty((0, 2)),
+                        np.empty((0, 2)),
+                    ),
+                    self.cones[orange],
                 )
-        else:
-            path_to_file = (
-                os.path.dirname(__file__) + "/data/" + name + "/" + name + "_cones.csv"
             )
-            path_to_center_line = (
-                os.path.dirname(__file__)
-                + "/data/"
-                + name
-                + "/"
-                + name
-                + "_center_line.csv"
+            track = Track.from_arrays(
+                self.name, cones, self.center_line, self.track_widths, closed
+            )
+            self._cached[key] = track
+        return track
+
+    @property
+    def cone_index(self) -> ConeIndex:
+        """Spatial index over the cones of the track, built on first access."""
+        cone_index = self._cached.get("cone_index")
+        if cone_index is None:
+            cone_index = self._cached["cone_index"] = ConeIndex(self.cones)
+        return cone_index
+
+    def query_nearest(
+        self, points: np.ndarray, k: int = 1, colors=None
+    ) -> NearestCones:
+        """
+        Finds the k nearest cones of each point of an (N, 2) array, optionally only
+        among the cones of the given types (names in CONE_TYPES or color codes). The
+        returned indices refer to rows of Track.cones. See ConeIndex.query_nearest().
+        """
+        return self.cone_index.query_nearest(points, k, colors)
+
+    def query_radius(
+        self, points: np.ndarray, radius: float, colors=None
+    ) -> ConesInRadius:
+        """
+        Finds the cones within radius of each point of an (N, 2) array, optionally
+        only among the cones of the given types, in compressed sparse row layout. The
+        returned indices refer to rows of Track.cones. See ConeIndex.query_radius().
+        """
+        return self.cone_index.query_radius(points, radius, colors)
+
+    def visible_cones(
+        self,
+        poses: np.ndarray,
+        max_range: float,
+        fov: float = 2 * np.pi,
+        colors=None,
+    ) -> VisibleCones:
+        """
+        Simulates a perception sensor: finds the cones within max_range and inside the
+        horizontal field of view fov (in radians, centered on the yaw) of each pose of
+        an (N, 3) array of (x, y, yaw), and returns them in the vehicle frame with their
+        color codes, in compressed sparse row layout. See ConeIndex.visible_cones().
+        """
+        return self.cone_index.visible_cones(poses, max_range, fov, colors)
+
+    def trajectory_collisions(
+        self,
+        trajectories: np.ndarray,
+        length: float,
+        width: float,
+        cone_radius: float = 0.15,
+        center_offset: float = 0.0,
+        colors=None,
+    ) -> TrajectoryCollisions:
+        """
+        Finds the cones hit by the length x width rectangular footprint of a vehicle
+        along each trajectory of a (B, T, 3) array of poses (x, y, yaw), with their
+        first hit times and the first collision time of each trajectory, in compressed
+        sparse row layout. All the cones (including the orange ones) are considered
+        unless colors is given. See ConeIndex.trajectory_collisions().
+        """
+        return self.cone_index.trajectory_collisions(
+            trajectories, length, width, cone_radius, center_offset, colors
+        )
+
+    @property
+    def area(self) -> TrackArea:
+        """
+        Drivable area of the track derived from the center line and the track widths,
+        built on first access (see TrackArea).
+        """
+        area = self._cached.get("area")
+        if area is None:
+            area = self._cached["area"] = TrackArea(
+                self.center_line, self.track_widths, self.is_closed
+            )
+        return area
+
+    def contains(self, points: np.ndarray) -> np.ndarray:
+        """
+        Tests whether the points of an (..., 2) array are on the track, i.e. inside its
+        drivable area (see TrackArea).
+        """
+        return self.area.contains(points)
+
+    def rasterize(
+        self,
+        resolution: float = 0.1,
+        cone_radius: float = 0.15,
+        padding: float = 1.0,
+        use_cache: bool = True,
+        cache_dir: Optional[str] = None,
+    ) -> TrackRaster:
+        """
+        Returns the occupancy grid and signed distance field of the track at the given
+        resolution (see rasterize_track()). The rasters are kept on the track for the
+        subsequent calls with the same parameters, and cached on disk by content hash
+        unless use_cache is False.
+        """
+        key = ("raster", resolution, cone_radius, padding)
+        raster = self._cached.get(key)
+        if raster is None:
+            raster = self._cached[key] = rasterize_track(
+                self.cones["xy"],
+                self.center_line,
+                self.track_widths,
+                self.is_closed,
+                resolution,
+                cone_radius,
+                padding,
+                use_cache,
+                cache_dir,
             )
-            (
-                self.blue_cones,
-                self.yellow_cones,
-                self.big_orange_cones,
-                self.small_orange_cones,
-                self.right_cones,
-                self.left_cones,
-            ) = load_cones(path_to_file)
+        return raster
+
+    def project(self, points: np.ndarray) -> FrenetProjection:
+        """
+        Projects a batch of positions (array of shape (..., 2)) onto the center line
+        and returns their Frenet coordinates: arc length s, signed lateral offset d
+        (positive on the left), index of the closest center line segment and heading
+        of this segment. On closed tracks, s wraps around at the end of the lap.
+        See geometry.project_on_segments() for details.
+        """
+        return project_on_segments(points, self.segments, self.is_closed)
 
-            self.center_line, self.track_widths = load_center_line(path_to_center_line)
 
+def load_track(name: str, use_cache: bool = True) -> Track:
+    return Track(name, use_cache=use_cache)
 
-def load_track(name: str) -> Track:
-    return Track(name)
+
+def compile_tracks(names: Optional[list[str]] = None) -> list[str]:
+    """
+    Compiles the cone and center line files of the given tracks (by default all the
+    available tracks) into memory-mappable binary files stored next to them, that Track
+    loads instead of the CSV files as long as they are more recent. The geometry of the
+    center line (see Track.geometry) is compiled as well. Returns the paths of the
+    written files.
+    """
+    written = []
+    for name in available_tracks if names is None else names:
+        cone_file, center_line_file = _track_files(name)
+        save_compiled(cone_file, load_cone_table(cone_file))
+        center_line, track_widths = load_center_line(center_line_file)
+        save_compiled(center_line_file, np.hstack((center_line, track_widths)))
+        save_compiled(
+            center_line_file,
+            center_line_geometry(center_line, track_widths, is_closed(center_line)),
+            suffix=_GEOMETRY_SUFFIX,
+        )
+        written += [
+            compiled_file(cone_file),
+            compiled_file(center_line_file),
+            compiled_file(center_line_file, _GEOMETRY_SUFFIX),
+        ]
+    return written
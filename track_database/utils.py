@@ -1,15 +1,157 @@
 # Copyright (c) Tudor Oancea, EPFL Racing Team Driverless 2022
+import os.path
+from typing import Optional
+
 import numpy as np
-from matplotlib import pyplot as plt
 
 __all__ = [
+    "CONE_TYPES",
+    "CONE_DTYPE",
+    "load_cone_table",
+    "split_cone_table",
+    "make_cone_table",
     "load_cones",
     "save_cones",
     "load_center_line",
     "save_center_line",
+    "is_closed",
+    "polyline_length",
+    "compiled_file",
+    "save_compiled",
+    "is_compiled",
+    "load_compiled",
     "plot_cones",
 ]
 
+# the color code of a cone is its index in this tuple
+CONE_TYPES = ("blue", "yellow", "big_orange", "small_orange")
+
+# one row of a cone file: cone_type,X,Y,Z,std_X,std_Y,std_Z,right,left (packed, 51
+# bytes per cone)
+CONE_DTYPE = np.dtype(
+    [
+        ("xy", np.float64, (2,)),
+        ("z", np.float64),
+        ("std", np.float64, (3,)),
+        ("color", np.uint8),
+        ("right", np.bool_),
+        ("left", np.bool_),
+    ]
+)
+
+
+# the columns of a cone file, as parsed by load_cone_table(). The numeric columns are
+# parsed directly at their offsets in CONE_DTYPE (right and left as integers in place
+# of the booleans), followed by the cone type
+_CONE_FILE_DTYPE = np.dtype(
+    {
+        "names": ["cone_type", "xy", "z", "std", "right", "left"],
+        "formats": ["S12", (np.float64, (2,)), np.float64, (np.float64, (3,))]
+        + [np.uint8] * 2,
+        "offsets": [CONE_DTYPE.itemsize]
+        + [CONE_DTYPE.fields[name][1] for name in ("xy", "z", "std", "right", "left")],
+        "itemsize": CONE_DTYPE.itemsize + 12,
+    }
+)
+# the columns of a cone file needed by load_cones()
+_CONE_FILE_COLUMNS = (0, 1, 2, 7, 8)
+_CONE_FILE_XY_DTYPE = np.dtype(
+    [
+        ("cone_type", "S12"),
+        ("xy", np.float64, (2,)),
+        ("right", np.uint8),
+        ("left", np.uint8),
+    ]
+)
+_SORTED_CONE_TYPES = np.array(sorted(CONE_TYPES), dtype="S12")
+_SORTED_CONE_CODES = np.array(
+    [CONE_TYPES.index(cone_type.decode()) for cone_type in _SORTED_CONE_TYPES],
+    dtype=np.uint8,
+)
+
+
+def _parse_cone_file(
+    filename: str, dtype: np.dtype, usecols: Optional[tuple] = None
+) -> np.ndarray:
+    return np.loadtxt(
+        filename,
+        delimiter=",",
+        dtype=dtype,
+        skiprows=1,
+        usecols=usecols,
+        ndmin=1,
+        encoding="latin1",
+    )
+
+
+def _color_codes(cone_type: np.ndarray) -> np.ndarray:
+    # map the cone types to their color code with a single lookup in the sorted types
+    idx = np.searchsorted(_SORTED_CONE_TYPES, cone_type).clip(max=len(CONE_TYPES) - 1)
+    return np.where(
+        _SORTED_CONE_TYPES[idx] == cone_type,
+        _SORTED_CONE_CODES[idx],
+        len(CONE_TYPES),
+    )
+
+
+def load_cone_table(filename: str) -> np.ndarray:
+    """
+    Loads the cones stored in CSV file specified by filename (see load_cones() for the
+    format) into a structured array of dtype CONE_DTYPE, in the same order as in the
+    file. The color column contains the index of the cone type in CONE_TYPES (or
+    len(CONE_TYPES) for unknown cone types).
+    The file is parsed in a single pass directly into the layout of the table.
+    """
+    arr = _parse_cone_file(filename, _CONE_FILE_DTYPE)
+    table = np.ndarray(arr.shape, dtype=CONE_DTYPE, buffer=arr, strides=arr.strides)
+    table["color"] = _color_codes(arr["cone_type"])
+    table["right"] = arr["right"] == 1
+    table["left"] = arr["left"] == 1
+    return table.copy()
+
+
+def split_cone_table(
+    table: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Splits a cone table of dtype CONE_DTYPE into the arrays returned by load_cones().
+    """
+    xy = table["xy"]
+    color = table["color"]
+    return (
+        *(xy[color == code] for code in range(len(CONE_TYPES))),
+        xy[table["right"]],
+        xy[table["left"]],
+    )
+
+
+def make_cone_table(
+    blue_cones: np.ndarray,
+    yellow_cones: np.ndarray,
+    big_orange_cones: np.ndarray,
+    small_orange_cones: np.ndarray,
+) -> np.ndarray:
+    """
+    Creates a cone table of dtype CONE_DTYPE from the positions of the cones of each
+    type (arrays of shape (N, 2)), with the same sides as save_cones(): blue cones on
+    the left, yellow cones on the right and orange cones on the side given by the
+    sign of their x coordinate.
+    """
+    cones = [
+        np.asarray(arr, dtype=np.float64).reshape(-1, 2)
+        for arr in (blue_cones, yellow_cones, big_orange_cones, small_orange_cones)
+    ]
+    table = np.zeros(sum(arr.shape[0] for arr in cones), dtype=CONE_DTYPE)
+    table["xy"] = np.concatenate(cones)
+    table["color"] = np.repeat(
+        np.arange(len(CONE_TYPES)), [arr.shape[0] for arr in cones]
+    )
+    orange = table["color"] >= CONE_TYPES.index("big_orange")
+    x = table["xy"][:, 0]
+    table["right"] = (table["color"] == CONE_TYPES.index("yellow")) | orange & (x > 0)
+    table["left"] = (table["color"] == CONE_TYPES.index("blue")) | orange & (x < 0)
+    return table
+
 
 def load_cones(
     filename: str,
@@ -20,22 +162,16 @@ def load_cones(
         cone_type,X,Y,Z,std_X,std_Y,std_Z,right,left
     The returned arrays correspond to (in this order) the blue cones, yellow cones, big
     orange cones, small orange cones (possibly empty), right cones and left cones (all
-    colors .
-    """
-    arr = np.genfromtxt(filename, delimiter=",", dtype=str, skip_header=1)
-    blue_cones = arr[arr[:, 0] == "blue"][:, 1:3].astype(float)
-    yellow_cones = arr[arr[:, 0] == "yellow"][:, 1:3].astype(float)
-    big_orange_cones = arr[arr[:, 0] == "big_orange"][:, 1:3].astype(float)
-    small_orange_cones = arr[arr[:, 0] == "small_orange"][:, 1:3].astype(float)
-    right_cones = arr[arr[:, 7] == "1"][:, 1:3].astype(float)
-    left_cones = arr[arr[:, 8] == "1"][:, 1:3].astype(float)
+    colors).
+    Only the columns needed for these arrays are parsed.
+    """
+    arr = _parse_cone_file(filename, _CONE_FILE_XY_DTYPE, _CONE_FILE_COLUMNS)
+    xy = arr["xy"]
+    color = _color_codes(arr["cone_type"])
     return (
-        blue_cones,
-        yellow_cones,
-        big_orange_cones,
-        small_orange_cones,
-        right_cones,
-        left_cones,
+        *(xy[color == code] for code in range(len(CONE_TYPES))),
+        xy[arr["right"] == 1],
+        xy[arr["left"] == 1],
     )
 
 
@@ -99,6 +235,74 @@ def save_center_line(filename: str, center_line: np.ndarray, track_widths: np.nd
     )
 
 
+def is_closed(center_line: np.ndarray) -> bool:
+    """
+    Returns whether the center line is a closed loop, i.e. whether its last point is
+    not further away from its first point than 1.5 times the longest of its segments.
+    """
+    if center_line.shape[0] < 3:
+        return False
+    gap = np.linalg.norm(center_line[-1] - center_line[0])
+    return bool(gap <= 1.5 * np.linalg.norm(np.diff(center_line, axis=0), axis=1).max())
+
+
+def polyline_length(points: np.ndarray, closed: bool = False) -> float:
+    """
+    Returns the length of the polyline defined by points (array of shape (N, 2)),
+    including the segment between the last and first points if closed is True.
+    """
+    length = np.linalg.norm(np.diff(points, axis=0), axis=1).sum()
+    if closed:
+        length += np.linalg.norm(points[0] - points[-1])
+    return float(length)
+
+
+def compiled_file(filename: str, suffix: str = "") -> str:
+    """
+    Returns the path of the compiled (binary) version of the CSV file specified by
+    filename, i.e. the same path with the extension .npy instead of .csv. An optional
+    suffix is appended to the name for data derived from the CSV file.
+    """
+    return os.path.splitext(filename)[0] + suffix + ".npy"
+
+
+def save_compiled(filename: str, arr: np.ndarray, suffix: str = ""):
+    """
+    Saves arr as the compiled version of the CSV file specified by filename. The CSV
+    file stays the source of truth, the compiled file is only used by load_compiled()
+    as long as it is more recent.
+    """
+    np.save(compiled_file(filename, suffix), np.ascontiguousarray(arr))
+
+
+def is_compiled(filename: str, suffix: str = "") -> bool:
+    """
+    Returns whether the compiled version of the CSV file specified by filename exists
+    and is more recent than the CSV file, i.e. whether load_compiled() would use it.
+    """
+    try:
+        return (
+            os.stat(compiled_file(filename, suffix)).st_mtime_ns
+            >= os.stat(filename).st_mtime_ns
+        )
+    except FileNotFoundError:
+        return False
+
+
+def load_compiled(
+    filename: str, writeable: bool = False, suffix: str = ""
+) -> Optional[np.ndarray]:
+    """
+    Memory-maps the compiled version of the CSV file specified by filename. Returns
+    None if it does not exist or if it is older than the CSV file. If writeable is
+    True, the mapping is copy-on-write so that the file is never modified.
+    """
+    if not is_compiled(filename, suffix):
+        return None
+    path = compiled_file(filename, suffix)
+    return np.load(path, mmap_mode="c" if writeable else "r").view(np.ndarray)
+
+
 def plot_cones(
     blue_cones,
     yellow_cones,
@@ -107,6 +311,10 @@ def plot_cones(
     origin=np.zeros(2),
     show=True,
 ):
+    # imported here to avoid loading matplotlib (and a GUI backend) when the package
+    # is used without plotting
+    from matplotlib import pyplot as plt
+
     plt.scatter(blue_cones[:, 0], blue_cones[:, 1], s=14, c="b", marker="^")
     plt.scatter(yellow_cones[:, 0], yellow_cones[:, 1], s=14, c="y", marker="^")
     plt.scatter(